@@ -0,0 +1,331 @@
+"""HTTP search service with warm in-process state.
+
+    python -m backend.api --port 8000
+    uvicorn backend.api:app --port 8000
+
+The export is loaded, embedded (or memory-mapped from a snapshot) and indexed
+once at startup; every request then reuses the same embedder, search backend,
+BM25 index and query cache. Endpoints are plain `def`s, so FastAPI runs them
+on its thread pool and requests are served concurrently.
+"""
+import argparse
+import copy
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from scipy.sparse import issparse, vstack as sp_vstack
+
+from backend import metrics
+from backend.config import (
+    API_HOST,
+    API_PORT,
+    CSV_PATH,
+    EMBEDDING_MODEL,
+    GENERATIVE_ENGINE_API_KEY,
+    GENERATIVE_ENGINE_BASE_URL,
+    OFFLINE_LSA_DIM,
+    SEARCH_BACKEND,
+    SEARCH_QUANTIZATION,
+    USE_ENGINE_EMBEDDINGS,
+)
+from backend.embedding_cache import EmbeddingCache
+from backend.embeddings import EngineEmbedder, offline_model_name
+from backend.dataset import id_key, load_dataset
+from backend.lexical import BM25_PATH, BM25Index, reciprocal_rank_fusion
+from backend.query_cache import QueryCache, vector_digest
+from backend.snapshots import file_signature, load_snapshot, offline_embedder_for, save_snapshot
+from backend.summaries import SummaryStore, attach_summaries
+from backend.summarizer import answer_query
+from backend.vector_store import get_client, make_backend, sync_records
+
+MODES = ("hybrid", "dense", "keyword")
+MAX_TOP_K = 100
+DOC_CHARS = 1200
+
+class SearchService:
+    """Everything a query needs, built once and shared by all requests."""
+
+    def __init__(self, source: str = CSV_PATH, use_engine: bool = USE_ENGINE_EMBEDDINGS,
+                 model: str = EMBEDDING_MODEL, search_kind: str = SEARCH_BACKEND,
+                 quantization: str = SEARCH_QUANTIZATION, client=None, bm25_path: str = BM25_PATH,
+                 summaries: Optional[SummaryStore] = None, lsa_dim: int = OFFLINE_LSA_DIM):
+        t0 = time.perf_counter()
+        self.source = source
+        self.dataset = load_dataset(source)
+        # Near-duplicate resumes are embedded and indexed once, via their cluster representative.
+        records = self.records = self.dataset.unique
+        if not records:
+            raise RuntimeError(self.dataset.stats.get("error") or f"No usable resumes in {source}")
+
+        kind = "engine" if use_engine else "offline"
+        self.signature = file_signature(source, len(records), kind, model if use_engine else offline_model_name(lsa_dim))
+        snapshot = load_snapshot(self.signature)
+        if snapshot is not None:
+            self.embedder, vectors = snapshot
+        else:
+            texts = self.dataset.unique_texts
+            if use_engine:
+                self.embedder = EngineEmbedder(model=model, cache=EmbeddingCache())
+                vectors = self.embedder.embed_batch(texts)
+            else:
+                self.embedder, vectors = offline_embedder_for(source, texts, lsa_dim=lsa_dim, cache=EmbeddingCache())
+            try:
+                save_snapshot(self.signature, kind, self.embedder, vectors)
+            except OSError:
+                pass
+
+        # Queries skip the persistent corpus cache (the query cache below holds them), so a
+        # cold start with a freshly fitted embedder and a warm one from a snapshot behave alike.
+        self.query_embedder = copy.copy(self.embedder)
+        self.query_embedder.cache = None
+
+        self.search_kind = search_kind
+        if search_kind == "chroma":
+            client = client or get_client()
+            sync_records(records, vectors, client=client, embedding_tag=self.embedder.model_id)
+        # Same shape as the UI's backend key; the service never searches passages.
+        self.backend_sig = (self.signature, search_kind, quantization, False, "max")
+        self.backend = make_backend(search_kind, records, vectors, quantization=quantization, client=client)
+
+        bm25_sig = repr(self.signature[:4])
+        self.bm25 = BM25Index.load(bm25_path, signature=bm25_sig)
+        if self.bm25 is None:
+            self.bm25 = BM25Index.build(records, signature=bm25_sig)
+            self.bm25.save(bm25_path)
+        self.bm25.documents = self.dataset.unique_texts
+
+        self.summaries = summaries
+        self.cache = QueryCache()
+        self.cache.set_signature(repr(self.backend_sig))
+        self.startup_seconds = round(time.perf_counter() - t0, 3)
+
+    def _embed(self, queries: List[str]):
+        """Query vectors in one embedder call for the ones not cached yet."""
+        model_id = self.embedder.model_id
+        vecs: List = [self.cache.embeddings.get((model_id, q)) for q in queries]
+        todo = [i for i, v in enumerate(vecs) if v is None]
+        if todo:
+            fresh = self.query_embedder.embed_batch([queries[i] for i in todo])
+            for n, i in enumerate(todo):
+                vecs[i] = fresh[n]
+                self.cache.embeddings.put((model_id, queries[i]), fresh[n])
+        return vecs
+
+    def with_summaries(self, hits: List[Dict]) -> List[Dict]:
+        if self.summaries is None or not hits:
+            return hits
+        return attach_summaries(hits, self.summaries, text_of=self._text_of)
+
+    def _text_of(self, candidate_id: str) -> Optional[str]:
+        rec = self.dataset.get(candidate_id)
+        return rec["Resume_str"] if rec else None
+
+    def search_many(self, queries: List[str], top_k: int = 10, mode: str = "hybrid",
+                    where: Optional[Dict] = None) -> List[List[Dict]]:
+        dense: List[List[Dict]] = [[] for _ in queries]
+        lexical: List[List[Dict]] = [[] for _ in queries]
+        if mode != "keyword":
+            vecs = self._embed(queries)
+            todo = []
+            for i, v in enumerate(vecs):
+                cached = self.cache.hits.get(self.cache.search_key(("dense", vector_digest(v)), where, top_k))
+                if cached is None:
+                    todo.append(i)
+                else:
+                    dense[i] = cached
+            if todo:
+                # One backend call for all uncached queries: a single matrix product / Chroma round trip.
+                fresh = self.backend.search_many(_stack([vecs[i] for i in todo]), top_k=top_k, where=where)
+                for i, hits in zip(todo, fresh):
+                    dense[i] = hits
+                    self.cache.hits.put(self.cache.search_key(("dense", vector_digest(vecs[i])), where, top_k), hits)
+        if mode != "dense":
+            for i, q in enumerate(queries):
+                lexical[i] = self.cache.search(("bm25", q), where, top_k,
+                                               lambda q=q: self.bm25.search(q, top_k=top_k, where=where))
+        if mode == "hybrid":
+            return [reciprocal_rank_fusion([d, l], top_k=top_k) for d, l in zip(dense, lexical)]
+        return dense if mode == "dense" else lexical
+
+def _stack(vectors: List):
+    if vectors and issparse(vectors[0]):
+        return sp_vstack(vectors, format="csr")
+    return np.vstack([np.asarray(v).reshape(1, -1) for v in vectors])
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    top_k: int = Field(10, ge=1, le=MAX_TOP_K)
+    mode: str = "hybrid"
+    category: Optional[str] = None
+    doc_chars: int = Field(DOC_CHARS, ge=0)
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=256)
+    top_k: int = Field(10, ge=1, le=MAX_TOP_K)
+    mode: str = "hybrid"
+    category: Optional[str] = None
+    doc_chars: int = Field(DOC_CHARS, ge=0)
+
+class AnswerRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    top_k: int = Field(10, ge=1, le=MAX_TOP_K)
+    mode: str = "hybrid"
+    category: Optional[str] = None
+    stream: bool = True
+
+def _public_hit(h: Dict, doc_chars: int, dataset=None) -> Dict:
+    meta = h.get("metadata") or {}
+    out = {
+        "id": str(h["id"]),
+        "category": meta.get("Category", ""),
+        "distance": h.get("distance"),
+        "document": (h.get("document") or "")[:doc_chars],
+    }
+    if "score" in h:
+        out["score"] = h["score"]
+    if "summary" in h:
+        out["summary"] = h["summary"]
+    duplicates = dataset.duplicates(h["id"]) if dataset is not None else []
+    if duplicates:
+        out["duplicate_ids"] = duplicates
+    return out
+
+def create_app(**service_kwargs) -> FastAPI:
+    """FastAPI app whose SearchService is built on startup from service_kwargs.
+
+    Stored summaries are used unless summaries is passed (None turns them off),
+    so `uvicorn backend.api:app` serves the same defaults as `python -m backend.api`.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if getattr(app.state, "service", None) is None:
+            kwargs = dict(service_kwargs)
+            if "summaries" not in kwargs:
+                kwargs["summaries"] = SummaryStore()
+            app.state.service = SearchService(**kwargs)
+        yield
+
+    app = FastAPI(title="CV search", lifespan=lifespan)
+
+    def _service() -> SearchService:
+        svc = getattr(app.state, "service", None)
+        if svc is None:
+            raise HTTPException(503, "Service is starting")
+        return svc
+
+    def _check_mode(mode: str):
+        if mode not in MODES:
+            raise HTTPException(422, f"mode must be one of {MODES}")
+
+    @app.get("/health")
+    def health():
+        svc = _service()
+        return {
+            "status": "ok",
+            "records": len(svc.dataset.records),
+            "indexed": len(svc.records),
+            "near_duplicates": svc.dataset.stats.get("near_duplicates", 0),
+            "source": svc.source,
+            "backend": svc.search_kind,
+            "embedder": svc.embedder.model_id,
+            "startup_seconds": svc.startup_seconds,
+            "cache": svc.cache.stats(),
+        }
+
+    @app.post("/search")
+    def search(req: SearchRequest):
+        _check_mode(req.mode)
+        where = {"Category": req.category} if req.category else None
+        svc = _service()
+        hits = svc.with_summaries(svc.search_many([req.query], top_k=req.top_k, mode=req.mode, where=where)[0])
+        return {"query": req.query, "hits": [_public_hit(h, req.doc_chars, svc.dataset) for h in hits]}
+
+    @app.post("/search/batch")
+    def search_batch(req: BatchSearchRequest):
+        _check_mode(req.mode)
+        where = {"Category": req.category} if req.category else None
+        svc = _service()
+        results = [svc.with_summaries(hits)
+                   for hits in svc.search_many(req.queries, top_k=req.top_k, mode=req.mode, where=where)]
+        return {"results": [
+            {"query": q, "hits": [_public_hit(h, req.doc_chars, svc.dataset) for h in hits]}
+            for q, hits in zip(req.queries, results)
+        ]}
+
+    @app.get("/candidates/{candidate_id}")
+    def candidate(candidate_id: str, include_html: bool = False):
+        dataset = _service().dataset
+        rec = dataset.get(candidate_id)
+        if rec is None:
+            raise HTTPException(404, "Candidate not found")
+        out = {"id": id_key(rec["ID"]), "category": rec["Category"], "resume": rec["Resume_str"],
+               "duplicate_ids": dataset.duplicates(candidate_id)}
+        if include_html:
+            out["resume_html"] = rec["Resume_html"]
+        return out
+
+    @app.post("/answer")
+    def answer(req: AnswerRequest):
+        _check_mode(req.mode)
+        svc = _service()
+        where = {"Category": req.category} if req.category else None
+        hits = svc.with_summaries(svc.search_many([req.query], top_k=req.top_k, mode=req.mode, where=where)[0])
+        if not hits:
+            raise HTTPException(404, "No results")
+        cached = svc.cache.lookup_answer(req.query, hits)
+        if cached is None and not (GENERATIVE_ENGINE_API_KEY and GENERATIVE_ENGINE_BASE_URL):
+            # Checked here: with stream=true the engine error would surface after the 200 headers.
+            raise HTTPException(503, "Answers need GENERATIVE_ENGINE_API_KEY and GENERATIVE_ENGINE_BASE_URL")
+        if not req.stream:
+            if cached is None:
+                cached = answer_query(req.query, hits)
+                svc.cache.store_answer(req.query, hits, cached)
+            return {"query": req.query, "answer": cached, "ids": [str(h["id"]) for h in hits]}
+        if cached is not None:
+            return PlainTextResponse(cached)
+
+        def pieces():
+            parts = []
+            for piece in answer_query(req.query, hits, stream=True):
+                parts.append(piece)
+                yield piece
+            svc.cache.store_answer(req.query, hits, "".join(parts))
+
+        return StreamingResponse(pieces(), media_type="text/plain; charset=utf-8")
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics_text():
+        return metrics.prometheus_text()
+
+    return app
+
+app = create_app()
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    ap = argparse.ArgumentParser(prog="python -m backend.api", description="Warm-state CV search service")
+    ap.add_argument("--host", default=API_HOST)
+    ap.add_argument("--port", type=int, default=API_PORT)
+    ap.add_argument("--source", default=CSV_PATH)
+    ap.add_argument("--engine", action="store_true", default=USE_ENGINE_EMBEDDINGS)
+    ap.add_argument("--backend", choices=["chroma", "numpy"], default=SEARCH_BACKEND)
+    ap.add_argument("--quantization", default=SEARCH_QUANTIZATION)
+    ap.add_argument("--lsa-dim", type=int, default=OFFLINE_LSA_DIM, help="LSA components for the offline embedder (0: off)")
+    ap.add_argument("--no-summaries", action="store_true", help="ignore stored resume summaries")
+    args = ap.parse_args(argv)
+
+    extra = {"summaries": None} if args.no_summaries else {}
+    service_app = create_app(source=args.source, use_engine=args.engine,
+                             search_kind=args.backend, quantization=args.quantization, lsa_dim=args.lsa_dim,
+                             **extra)
+    # A single worker keeps one copy of the warm state; concurrency comes from the thread pool.
+    uvicorn.run(service_app, host=args.host, port=args.port, workers=1)
+
+if __name__ == "__main__":
+    main()
@@ -12,4 +12,56 @@ CHAT_MODEL = os.getenv("GENERATIVE_ENGINE_CHAT_MODEL", "openai.gpt-3.5-turbo")
 REQUEST_TIMEOUT = float(os.getenv("GENERATIVE_ENGINE_TIMEOUT_SEC", "240"))
 EMBED_BATCH = int(os.getenv("EMBED_BATCH", "128"))
 USE_ENGINE_EMBEDDINGS = os.getenv("USE_ENGINE_EMBEDDINGS", "False").lower() == "False"
-CSV_PATH = os.getenv("CSV_PATH", DEFAULT_CSV)
\ No newline at end of file
+CSV_PATH = os.getenv("CSV_PATH", DEFAULT_CSV)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "cache"))
+HTML_WORKERS = int(os.getenv("HTML_WORKERS", "0"))
+HTML_CACHE_PATH = os.getenv("HTML_CACHE_PATH", os.path.join(CACHE_DIR, "html_text.sqlite"))
+FRAME_CACHE_DIR = os.getenv("FRAME_CACHE_DIR", os.path.join(CACHE_DIR, "frames"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(CACHE_DIR, "snapshots"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+ENGINE_MAX_RETRIES = int(os.getenv("GENERATIVE_ENGINE_MAX_RETRIES", "5"))
+ENGINE_BACKOFF_BASE = float(os.getenv("GENERATIVE_ENGINE_BACKOFF_BASE_SEC", "0.5"))
+ENGINE_BACKOFF_MAX = float(os.getenv("GENERATIVE_ENGINE_BACKOFF_MAX_SEC", "30"))
+ENGINE_POOL_SIZE = int(os.getenv("GENERATIVE_ENGINE_POOL_SIZE", "16"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite"))
+EMBED_CACHE_MAX_ITEMS = int(os.getenv("EMBED_CACHE_MAX_ITEMS", "500000"))
+EMBED_CACHE_OFFLINE_MAX_ITEMS = int(os.getenv("EMBED_CACHE_OFFLINE_MAX_ITEMS", "100000"))
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "chroma").lower()
+SEARCH_QUANTIZATION = os.getenv("SEARCH_QUANTIZATION", "none").lower()
+QUERY_CACHE_MAX_ITEMS = int(os.getenv("QUERY_CACHE_MAX_ITEMS", "1024"))
+QUERY_CACHE_TTL_SEC = float(os.getenv("QUERY_CACHE_TTL_SEC", "3600"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join(CACHE_DIR, "query_cache.pkl"))
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "80"))
+CHUNK_WORDS = int(os.getenv("CHUNK_WORDS", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "40"))
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+METRICS_OTEL = os.getenv("METRICS_OTEL", "False").lower() == "true"
+METRICS_PROMETHEUS_PORT = int(os.getenv("METRICS_PROMETHEUS_PORT", "0"))
+INGEST_STATE_DIR = os.getenv("INGEST_STATE_DIR", os.path.join(CACHE_DIR, "ingest"))
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "2000"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "2"))
+INGEST_FIT_ROWS = int(os.getenv("INGEST_FIT_ROWS", "20000"))
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+DATASET_CACHE_ITEMS = int(os.getenv("DATASET_CACHE_ITEMS", "2"))
+GENERATIVE_ENGINE_MODEL = os.getenv("GENERATIVE_ENGINE_MODEL") or CHAT_MODEL
+SUMMARY_STORE_PATH = os.getenv("SUMMARY_STORE_PATH", os.path.join(CACHE_DIR, "summaries.sqlite"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+SUMMARY_RATE_PER_SEC = float(os.getenv("SUMMARY_RATE_PER_SEC", "2"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "3000"))
+HASH_FEATURES = int(os.getenv("HASH_FEATURES", "1024"))
+OFFLINE_LSA_DIM = int(os.getenv("OFFLINE_LSA_DIM", "0"))
+EMBED_MAX_INPUT_TOKENS = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8000"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_LONG_INPUTS = os.getenv("EMBED_LONG_INPUTS", "split").lower()
+EMBED_SLOW_SECONDS = float(os.getenv("EMBED_SLOW_SECONDS", "20"))
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "False").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "3"))
+QUERY_CACHE_FLUSH_SEC = float(os.getenv("QUERY_CACHE_FLUSH_SEC", "5"))
+OFFLINE_REFIT_OVERLAP = float(os.getenv("OFFLINE_REFIT_OVERLAP", "0.5"))
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from backend.config import DATASET_CACHE_ITEMS, DEDUP_ENABLED
+from backend.dedup import find_near_duplicates
+from backend.file_processor import id_key, load_resumes_with_stats  # noqa: F401 (id_key re-exported)
+
+TABLE_COLUMNS = ["ID", "Category", "Resume_str"]
+
+def source_signature(path: str) -> Tuple[str, int, int]:
+    """(abs path, mtime_ns, size); (path, 0, 0) when the file is missing."""
+    try:
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+    except OSError:
+        return os.path.abspath(path), 0, 0
+
+class Dataset:
+    """Parsed records of one source file plus the lookups the UI and API need.
+
+    With dedup, near-duplicate resumes are clustered (backend.dedup): `unique`
+    holds one representative per cluster for embedding and indexing, while
+    `records`, `by_id` and get() still cover every row.
+    """
+
+    def __init__(self, records: List[Dict], stats: Dict, signature: Tuple[str, int, int],
+                 dedup: bool = DEDUP_ENABLED):
+        self.records = records
+        self.stats = stats
+        self.signature = signature
+        self.by_id: Dict[str, Dict] = {}
+        for r in records:
+            # Later duplicates win, as in the vector index.
+            self.by_id[id_key(r["ID"])] = r
+        self.cluster_of: Dict[str, str] = {}
+        self.members: Dict[str, List[str]] = {}
+        self.unique = records
+        if dedup and records:
+            keep, self.cluster_of, dup_stats = find_near_duplicates(records, key_of=lambda r: id_key(r["ID"]))
+            self.unique = [records[i] for i in keep]
+            for key, rep in self.cluster_of.items():
+                if key != rep:
+                    self.members.setdefault(rep, []).append(key)
+            self.stats = dict(stats, **dup_stats)
+        self._texts: Optional[List[str]] = None
+        self._unique_texts: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def texts(self) -> List[str]:
+        if self._texts is None:
+            self._texts = [r["Resume_str"] for r in self.records]
+        return self._texts
+
+    @property
+    def unique_texts(self) -> List[str]:
+        if self._unique_texts is None:
+            self._unique_texts = [r["Resume_str"] for r in self.unique]
+        return self._unique_texts
+
+    def get(self, candidate_id) -> Optional[Dict]:
+        return self.by_id.get(id_key(candidate_id))
+
+    def representative(self, candidate_id) -> str:
+        """Key of the indexed record standing for candidate_id (itself unless it is a near-duplicate)."""
+        key = id_key(candidate_id)
+        return self.cluster_of.get(key, key)
+
+    def duplicates(self, candidate_id) -> List[str]:
+        """Other IDs in candidate_id's near-duplicate cluster."""
+        key = id_key(candidate_id)
+        rep = self.representative(key)
+        return [k for k in [rep] + self.members.get(rep, []) if k != key]
+
+    def page_count(self, size: int) -> int:
+        return max(1, -(-len(self.records) // max(1, size)))
+
+    def page(self, number: int, size: int, columns: List[str] = TABLE_COLUMNS) -> pd.DataFrame:
+        """Rows of page number (0-based) as a DataFrame, built only for that slice."""
+        start = max(0, number) * max(1, size)
+        rows = self.records[start:start + size]
+        return pd.DataFrame([{c: r.get(c) for c in columns} for r in rows], columns=columns,
+                            index=range(start, start + len(rows)))
+
+_datasets: "OrderedDict[Tuple[str, int, int], Dataset]" = OrderedDict()
+_lock = threading.Lock()
+
+def load_dataset(path: str, refresh: bool = False) -> Dataset:
+    """Process-wide cached Dataset for path; the file is parsed once per (path, mtime, size)."""
+    sig = source_signature(path)
+    with _lock:
+        ds = _datasets.get(sig)
+        if ds is not None and not refresh:
+            _datasets.move_to_end(sig)
+            return ds
+        # Parsing under the lock means concurrent sessions wait for one parse instead of racing.
+        records, stats = load_resumes_with_stats(path)
+        ds = Dataset(records, stats, sig)
+        _datasets[sig] = ds
+        for stale in [k for k in _datasets if k[0] == sig[0] and k != sig]:
+            del _datasets[stale]
+        while len(_datasets) > max(1, DATASET_CACHE_ITEMS):
+            _datasets.popitem(last=False)
+        return ds
+
+def clear_datasets():
+    with _lock:
+        _datasets.clear()
@@ -0,0 +1,188 @@
+"""Near-duplicate resume detection with MinHash signatures and LSH banding.
+
+Each text is reduced to the set of its word shingles (DEDUP_SHINGLE_WORDS
+consecutive words) and a DEDUP_NUM_PERM-value MinHash signature of that set.
+Signatures are cut into DEDUP_BANDS bands; texts sharing a band bucket with a
+cluster representative are candidates, and a candidate joins the cluster when
+the signatures agree on at least DEDUP_THRESHOLD of their values (estimated
+Jaccard similarity). Records are only clustered within their Category.
+Only representatives are kept in the buckets, so a pass is roughly linear in
+the number of texts and clusters never drift by chaining.
+"""
+import re
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import (
+    DEDUP_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_BANDS,
+    DEDUP_SHINGLE_WORDS,
+)
+from backend import metrics
+from backend.file_processor import id_key
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SHINGLE_MULT = np.uint32(0x01000193)
+_MIX = np.uint32(0x9E3779B1)
+_WORD_CACHE_MAX = 1_000_000
+_word_hashes: Dict[str, int] = {}
+
+def _word_hash(word: str) -> int:
+    h = _word_hashes.get(word)
+    if h is None:
+        if len(_word_hashes) >= _WORD_CACHE_MAX:
+            _word_hashes.clear()
+        h = _word_hashes[word] = zlib.crc32(word.encode("utf-8", "surrogatepass"))
+    return h
+
+def shingle_hashes(text: str, k: int = DEDUP_SHINGLE_WORDS) -> np.ndarray:
+    """uint32 hashes of the k-word shingles of text (one shingle if it is shorter).
+
+    Repeated shingles repeat their hash; MinHash only takes minima, so they are left in.
+    """
+    words = _WORD.findall((text or "").lower())
+    if not words:
+        return np.empty(0, dtype=np.uint32)
+    w = np.fromiter(map(_word_hash, words), dtype=np.uint32, count=len(words))
+    k = max(1, min(int(k), len(w)))
+    n = len(w) - k + 1
+    h = w[:n].copy()
+    for j in range(1, k):
+        h = h * _SHINGLE_MULT + w[j:j + n]
+    h = h * _MIX
+    h ^= h >> np.uint32(16)
+    return h
+
+class NearDuplicateIndex:
+    """Incremental MinHash/LSH clustering: add() texts one by one, in order.
+
+    The first text of a cluster is its representative; add() returns the
+    number (in add order) of the representative a text was assigned to, its
+    own number when it starts a new cluster.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_BANDS, shingle_words: int = DEDUP_SHINGLE_WORDS, seed: int = 1):
+        self.threshold = float(threshold)
+        self.bands = max(1, min(int(bands), int(num_perm)))
+        self.rows = max(1, int(num_perm) // self.bands)
+        self.num_perm = self.bands * self.rows
+        self.shingle_words = shingle_words
+        rng = np.random.RandomState(seed)
+        self._xor = rng.randint(0, 2 ** 32, size=self.num_perm, dtype=np.uint64).astype(np.uint32)
+        self._mult = (rng.randint(0, 2 ** 31, size=self.num_perm, dtype=np.uint64) * 2 + 1).astype(np.uint32)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._exact: Dict[bytes, int] = {}
+        self._count = 0
+        self._reps: List[int] = []
+        self._sigs: List[np.ndarray] = []
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of text, None when it has no words."""
+        h = shingle_hashes(text, self.shingle_words)
+        if not len(h):
+            return None
+        v = (h[:, None] ^ self._xor) * self._mult
+        v ^= v >> np.uint32(15)
+        return v.min(axis=0)
+
+    def add(self, text: str) -> int:
+        number = self._count
+        self._count += 1
+        sig = self.signature(text)
+        if sig is None:
+            return number
+        raw = sig.tobytes()
+        rep = self._exact.get(raw)
+        if rep is not None:
+            return self._reps[rep]
+
+        band_keys = [raw[b * self.rows * 4:(b + 1) * self.rows * 4] for b in range(self.bands)]
+        best, best_sim = None, self.threshold
+        seen = set()
+        for b, bk in enumerate(band_keys):
+            for cand in self._buckets[b].get(bk, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                sim = float(np.count_nonzero(self._sigs[cand] == sig)) / self.num_perm
+                if sim >= best_sim:
+                    best, best_sim = cand, sim
+        if best is not None:
+            return self._reps[best]
+
+        n = len(self._reps)
+        self._reps.append(number)
+        self._sigs.append(sig)
+        self._exact[raw] = n
+        for b, bk in enumerate(band_keys):
+            self._buckets[b].setdefault(bk, []).append(n)
+        return number
+
+class RecordClusters:
+    """Streaming record clustering: feed records in file order to add().
+
+    Records are only compared within their Category, so a CV sent to several
+    roles keeps one copy per role and category filters still find it. The
+    app (find_near_duplicates over a whole file) and backend.ingest (chunk by
+    chunk) share this class, so both pick the same representatives.
+    """
+
+    def __init__(self, key_of: Callable[[Dict], str] = lambda r: id_key(r["ID"]),
+                 threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS):
+        self.key_of = key_of
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self._indexes: Dict[str, NearDuplicateIndex] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._sizes: Dict[Tuple[str, int], int] = {}
+        self.records = 0
+        self.representatives = 0
+
+    def add(self, record: Dict) -> Tuple[str, bool]:
+        """(key of the record's representative, whether the record is that representative)."""
+        group = record.get("Category") or ""
+        index = self._indexes.get(group)
+        if index is None:
+            index = self._indexes[group] = NearDuplicateIndex(self.threshold, self.num_perm, self.bands)
+            self._keys[group] = []
+        keys = self._keys[group]
+        key = self.key_of(record)
+        number = len(keys)
+        keys.append(key)
+        rep = index.add(record.get("Resume_str") or "")
+        self._sizes[(group, rep)] = self._sizes.get((group, rep), 0) + 1
+        self.records += 1
+        if rep == number:
+            self.representatives += 1
+        return keys[rep], rep == number
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rows_unique": self.representatives,
+            "near_duplicates": self.records - self.representatives,
+            "duplicate_clusters": sum(1 for n in self._sizes.values() if n > 1),
+        }
+
+def find_near_duplicates(records: List[Dict], key_of: Callable[[Dict], str] = lambda r: id_key(r["ID"]),
+                         threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                         bands: int = DEDUP_BANDS) -> Tuple[List[int], Dict[str, str], Dict[str, int]]:
+    """Cluster records by their Resume_str, within each Category.
+
+    Returns (positions of the representative records, map of every record key
+    to its representative's key, counts for the stats dict).
+    """
+    clusters = RecordClusters(key_of, threshold=threshold, num_perm=num_perm, bands=bands)
+    keep: List[int] = []
+    cluster_of: Dict[str, str] = {}
+    with metrics.span("dedup", items=len(records)):
+        for pos, r in enumerate(records):
+            rep, is_rep = clusters.add(r)
+            cluster_of[key_of(r)] = rep
+            if is_rep:
+                keep.append(pos)
+    return keep, cluster_of, clusters.stats()
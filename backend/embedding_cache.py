@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from backend.config import EMBED_CACHE_PATH, EMBED_CACHE_MAX_ITEMS, EMBED_CACHE_OFFLINE_MAX_ITEMS
+from backend import metrics
+
+SQLITE_MAX_VARS = 900
+# model_id prefixes of the locally fitted embedders (OfflineEmbedder, HashingEmbedder).
+OFFLINE_PREFIXES = ("tfidf-", "hash-")
+_OFFLINE_SQL = "(" + " OR ".join(f"model LIKE '{p}%'" for p in OFFLINE_PREFIXES) + ")"
+
+def is_offline_model(model: str) -> bool:
+    return model.startswith(OFFLINE_PREFIXES)
+
+def _scope_sql(scope: str) -> str:
+    return _OFFLINE_SQL if scope == "offline" else f"NOT {_OFFLINE_SQL}"
+
+def text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+class EmbeddingCache:
+    """Persistent (model, text hash) -> vector store with LRU eviction past max_items.
+
+    Dense vectors are stored as float32 bytes; sparse (TF-IDF) rows keep only
+    their non-zero indices and values. Rows of locally fitted embedders are
+    evicted within their own offline_max_items budget, so cheap-to-recompute
+    TF-IDF rows never push out engine embeddings.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_items: int = EMBED_CACHE_MAX_ITEMS,
+                 offline_max_items: int = EMBED_CACHE_OFFLINE_MAX_ITEMS):
+        self.path = path
+        self.max_items = max(1, int(max_items))
+        self.offline_max_items = max(1, int(offline_max_items))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS emb ("
+                " model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL,"
+                " data BLOB NOT NULL, idx BLOB, last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS emb_last_used ON emb (last_used)")
+            # Running row count per eviction scope, kept in the same transaction as
+            # every insert and eviction so a write never has to COUNT(*) the table.
+            con.execute("CREATE TABLE IF NOT EXISTS emb_count (scope TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+            for scope in ("offline", "engine"):
+                if con.execute("SELECT 1 FROM emb_count WHERE scope = ?", (scope,)).fetchone() is None:
+                    n = con.execute(f"SELECT COUNT(*) FROM emb WHERE {_scope_sql(scope)}").fetchone()[0]
+                    con.execute("INSERT OR IGNORE INTO emb_count (scope, n) VALUES (?, ?)", (scope, n))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, object]:
+        found: Dict[str, object] = {}
+        now = time.time()
+        with self._lock, self._connect() as con:
+            for i in range(0, len(keys), SQLITE_MAX_VARS):
+                chunk = keys[i:i + SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(chunk))
+                rows = con.execute(
+                    f"SELECT key, dim, data, idx FROM emb WHERE model = ? AND key IN ({marks})",
+                    [model, *chunk],
+                )
+                for key, dim, data, idx in rows:
+                    found[key] = _decode(dim, data, idx)
+                if found:
+                    con.execute(
+                        f"UPDATE emb SET last_used = ? WHERE model = ? AND key IN ({marks})",
+                        [now, model, *chunk],
+                    )
+        return found
+
+    def put_many(self, model: str, keys: List[str], vectors):
+        if not keys:
+            return
+        now = time.time()
+        # Later rows win for a repeated key, as with INSERT OR REPLACE.
+        rows = list({k: (model, k, *_encode(vectors, n), now) for n, k in enumerate(keys)}.values())
+        scope = "offline" if is_offline_model(model) else "engine"
+        budget = self.offline_max_items if scope == "offline" else self.max_items
+        with self._lock, self._connect() as con:
+            new = len(rows)
+            for i in range(0, len(rows), SQLITE_MAX_VARS):
+                chunk = [r[1] for r in rows[i:i + SQLITE_MAX_VARS]]
+                marks = ",".join("?" * len(chunk))
+                new -= con.execute(
+                    f"SELECT COUNT(*) FROM emb WHERE model = ? AND key IN ({marks})", [model, *chunk]
+                ).fetchone()[0]
+            con.executemany(
+                "INSERT OR REPLACE INTO emb (model, key, dim, data, idx, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            con.execute("UPDATE emb_count SET n = n + ? WHERE scope = ?", (new, scope))
+            count = con.execute("SELECT n FROM emb_count WHERE scope = ?", (scope,)).fetchone()[0]
+            if count > budget:
+                deleted = con.execute(
+                    f"DELETE FROM emb WHERE rowid IN (SELECT rowid FROM emb WHERE {_scope_sql(scope)} "
+                    "ORDER BY last_used LIMIT ?)",
+                    (count - budget,),
+                ).rowcount
+                con.execute("UPDATE emb_count SET n = n - ? WHERE scope = ?", (deleted, scope))
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as con:
+            items = con.execute("SELECT COALESCE(SUM(n), 0) FROM emb_count").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "items": int(items),
+                "max_items": self.max_items + self.offline_max_items}
+
+    def embed(self, model: str, texts: List[str], compute: Callable[[List[str]], object]):
+        """Vectors for texts in order, calling compute only on distinct texts not cached yet."""
+        keys = [text_key(t) for t in texts]
+        found = self.get_many(model, list(dict.fromkeys(keys)))
+
+        todo: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in todo:
+                todo[k] = t
+        hits = len(keys) - sum(1 for k in keys if k in todo)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(todo)
+        metrics.incr("embedding_cache.hits", hits)
+        metrics.incr("embedding_cache.misses", len(todo))
+
+        if todo:
+            fresh = compute(list(todo.values()))
+            self.put_many(model, list(todo.keys()), fresh)
+            for n, k in enumerate(todo):
+                found[k] = _row(fresh, n)
+        return _stack([found[k] for k in keys])
+
+def _row(vectors, n: int):
+    if issparse(vectors):
+        return csr_matrix(vectors[n])
+    return np.asarray(vectors[n], dtype=np.float32)
+
+def _encode(vectors, n: int):
+    if issparse(vectors):
+        row = csr_matrix(vectors[n])
+        return (
+            row.shape[1],
+            row.data.astype(np.float32).tobytes(),
+            row.indices.astype(np.int32).tobytes(),
+        )
+    row = np.asarray(vectors[n], dtype=np.float32).ravel()
+    return row.shape[0], row.tobytes(), None
+
+def _decode(dim: int, data: bytes, idx: Optional[bytes]):
+    values = np.frombuffer(data, dtype=np.float32)
+    if idx is None:
+        return values
+    indices = np.frombuffer(idx, dtype=np.int32)
+    return csr_matrix((values, indices, np.array([0, len(indices)])), shape=(1, dim))
+
+def _stack(rows: List[object]):
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    if any(issparse(r) for r in rows):
+        rows = [csr_matrix(r) for r in rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([r.nnz for r in rows], out=indptr[1:])
+        data = np.concatenate([r.data for r in rows]).astype(np.float32, copy=False)
+        indices = np.concatenate([r.indices for r in rows])
+        return csr_matrix((data, indices, indptr), shape=(len(rows), rows[0].shape[1]))
+    return np.vstack(rows).astype(np.float32, copy=False)
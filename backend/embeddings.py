@@ -1,80 +1,540 @@
-from typing import Optional, Callable, List
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Callable, Iterable, List, Tuple
+import joblib
 import numpy as np
-from scipy.sparse import spmatrix
-from sklearn.feature_extraction.text import TfidfVectorizer
+import requests
+from scipy.sparse import csr_matrix, issparse, vstack as sp_vstack
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
 
-from backend.config import EMBEDDING_MODEL, EMBED_BATCH
+from backend.config import (
+    EMBEDDING_MODEL,
+    EMBED_BATCH,
+    EMBED_WORKERS,
+    EMBED_BATCH_TOKENS,
+    EMBED_MAX_INPUT_TOKENS,
+    EMBED_LONG_INPUTS,
+    EMBED_SLOW_SECONDS,
+    HASH_FEATURES,
+    OFFLINE_LSA_DIM,
+)
 from backend.engine_client import EngineClient
+from backend.embedding_cache import EmbeddingCache
+from backend import metrics
+from backend.tokens import count_tokens, split_tokens, truncate_tokens
 
 ProgressCb = Optional[Callable[[int, int, str], None]]
 
+TRANSFORM_CHUNK = 2000
+
+def sparse_top_k(matrix: csr_matrix, query, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine top-k of one query against L2-normalised CSR rows, without densifying the corpus."""
+    q = query if issparse(query) else csr_matrix(np.asarray(query, dtype=matrix.dtype).reshape(1, -1))
+    scores = np.asarray((matrix @ q.T).todense()).ravel()
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, scores[idx]
+
+def to_dense(vectors) -> np.ndarray:
+    """Dense view for backends that need plain float lists (Chroma, JSON)."""
+    if issparse(vectors):
+        return vectors.toarray()
+    return np.asarray(vectors)
+
+def offline_model_name(lsa_dim: int = OFFLINE_LSA_DIM) -> str:
+    """Snapshot/cache label of the offline embedder configuration."""
+    return f"tfidf-384-lsa{lsa_dim}" if lsa_dim else "tfidf-384"
+
 class OfflineEmbedder:
-    def __init__(self, dimension: int = 384):
-        self.vectorizer = TfidfVectorizer(max_features=dimension)
+    """TF-IDF over a fitted vocabulary of `dimension` terms.
+
+    With lsa_dim > 0 a TruncatedSVD fitted on the same corpus projects every
+    vector (corpus, batches and queries alike) to lsa_dim dense, L2-normalized
+    components; output is then always dense float32.
+    """
+
+    def __init__(self, dimension: int = 384, sparse: bool = False, cache: Optional[EmbeddingCache] = None,
+                 lsa_dim: int = OFFLINE_LSA_DIM):
+        self.sparse = sparse
+        self.cache = cache
+        self.lsa_dim = max(0, int(lsa_dim))
+        self.svd: Optional[TruncatedSVD] = None
+        if sparse:
+            self.vectorizer = TfidfVectorizer(max_features=dimension, dtype=np.float32)
+        else:
+            self.vectorizer = TfidfVectorizer(max_features=dimension)
         self.fitted = False
-        self.matrix: Optional[spmatrix] = None
+        self.matrix = None
+        self._model_id: Optional[str] = None
 
-    def fit(self, texts: List[str]):
-        self.vectorizer.fit(texts)
+    @property
+    def model_id(self) -> str:
+        """Cache namespace: TF-IDF vectors are only comparable under the same fitted vocabulary."""
+        if not self.fitted:
+            raise RuntimeError("Call fit() before model_id")
+        if self._model_id is None:
+            h = hashlib.blake2b(digest_size=12)
+            for term, col in sorted(self.vectorizer.vocabulary_.items()):
+                h.update(f"{term}\0{col}\0".encode())
+            h.update(np.asarray(self.vectorizer.idf_, dtype=np.float64).tobytes())
+            prefix = f"tfidf-{len(self.vectorizer.vocabulary_)}"
+            if self.svd is not None:
+                h.update(np.asarray(self.svd.components_, dtype=np.float64).tobytes())
+                prefix += f"-lsa{self.svd.n_components}"
+            self._model_id = f"{prefix}-{h.hexdigest()}"
+        return self._model_id
+
+    def _fit_svd(self, tfidf) -> Optional[TruncatedSVD]:
+        # Randomized SVD needs fewer components than features; with a single
+        # feature there is nothing to project, so the vectors stay TF-IDF.
+        if not self.lsa_dim or tfidf.shape[1] < 2:
+            return None
+        k = min(self.lsa_dim, tfidf.shape[1] - 1)
+        return TruncatedSVD(n_components=k, algorithm="randomized", random_state=0).fit(tfidf)
+
+    def _project(self, tfidf):
+        if self.svd is None:
+            return tfidf
+        return normalize(self.svd.transform(tfidf).astype(np.float32), copy=False)
+
+    def _fit(self, texts: List[str]) -> csr_matrix:
+        # fit() and fit_transform() fit the SVD on this same matrix, so the
+        # cached and uncached paths end up with identical models (and model_id).
+        tfidf = csr_matrix(self.vectorizer.fit_transform(texts))
+        self.svd = self._fit_svd(tfidf)
         self.fitted = True
+        self._model_id = None
+        return tfidf
 
-    def embed(self, text: str) -> np.ndarray:
+    def fit(self, texts: List[str]):
+        self._fit(texts)
+
+    def fit_transform(self, texts: List[str]):
+        if self.cache is None:
+            with metrics.span("embed", items=len(texts), embedder="offline"):
+                self.matrix = self._project(self._fit(texts))
+        else:
+            self.fit(texts)
+            self.matrix = self._cached_transform(texts)
+            if self.svd is None:
+                self.matrix = csr_matrix(self.matrix)
+        return self._out(self.matrix)
+
+    def _out(self, mat):
+        if self.svd is not None:
+            return np.asarray(mat, dtype=np.float32)
+        if self.sparse:
+            return csr_matrix(mat)
+        return np.asarray(mat.todense())
+
+    def _transform(self, texts: List[str], update: ProgressCb = None):
+        total = len(texts)
+        blocks = []
+        with metrics.span("embed", items=total, embedder="offline"):
+            for i in range(0, total, TRANSFORM_CHUNK):
+                blocks.append(self._project(self.vectorizer.transform(texts[i:i + TRANSFORM_CHUNK])))
+                if update:
+                    update(min(i + TRANSFORM_CHUNK, total), total, "Vectorizing")
+        if self.svd is not None:
+            return np.vstack(blocks) if blocks else np.empty((0, self.svd.n_components), dtype=np.float32)
+        if not blocks:
+            return csr_matrix(self.vectorizer.transform([]))
+        return sp_vstack(blocks, format="csr")
+
+    def _cached_transform(self, texts: List[str], update: ProgressCb = None):
+        if self.cache is None or not texts:
+            return self._transform(texts, update)
+        return self.cache.embed(self.model_id, texts, lambda todo: self._transform(todo, update))
+
+    def embed(self, text: str):
         if not self.fitted:
             raise RuntimeError("Call fit() before embed()")
         vec_sparse = self.vectorizer.transform([text])
+        if self.svd is not None:
+            return self._project(vec_sparse)[0]
+        if self.sparse:
+            return csr_matrix(vec_sparse)
         vec = np.asarray(vec_sparse.todense()).flatten()
         return vec
 
-    def embed_batch(self, texts: List[str]) -> np.ndarray:
+    def embed_batch(self, texts: List[str]):
         if not self.fitted:
             raise RuntimeError("Call fit() before embed_batch()")
-        mat = self.vectorizer.transform(texts)
-        return np.asarray(mat.todense())
+        return self._out(self._cached_transform(texts))
 
-    def embed_batch_with_progress(self, texts: List[str], update: ProgressCb = None) -> np.ndarray:
+    def embed_batch_with_progress(self, texts: List[str], update: ProgressCb = None):
         if not self.fitted:
             raise RuntimeError("Call fit() before embed_batch_with_progress()")
+        return self._out(self._cached_transform(texts, update))
+
+    def save(self, path: str):
+        joblib.dump({"vectorizer": self.vectorizer, "sparse": self.sparse, "lsa_dim": self.lsa_dim, "svd": self.svd}, path)
+
+    @classmethod
+    def load(cls, path: str) -> "OfflineEmbedder":
+        state = joblib.load(path)
+        emb = cls(sparse=state["sparse"], lsa_dim=state.get("lsa_dim", 0))
+        emb.vectorizer = state["vectorizer"]
+        emb.svd = state.get("svd")
+        emb.fitted = True
+        return emb
+
+    def search(self, text: str, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices and cosine scores of the fitted corpus closest to text."""
+        if self.matrix is None:
+            raise RuntimeError("Call fit_transform() before search()")
+        if self.svd is None:
+            return sparse_top_k(self.matrix, self.vectorizer.transform([text]), top_k)
+        scores = np.asarray(self.matrix) @ self.embed(text)
+        k = min(top_k, scores.shape[0])
+        idx = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.int64)
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        return idx, scores[idx]
+
+class HashingEmbedder:
+    """Out-of-core TF-IDF: hashed term counts weighted by incrementally accumulated IDF.
+
+    Feature hashing needs no vocabulary and document frequencies are summed
+    chunk by chunk (partial_fit / fit_stream), so memory is bounded by
+    n_features and the chunk size, never by the corpus. Vectors are sparse,
+    L2-normalized rows like OfflineEmbedder(sparse=True) produces.
+    """
+
+    def __init__(self, n_features: int = HASH_FEATURES, cache: Optional[EmbeddingCache] = None):
+        self.n_features = int(n_features)
+        self.cache = cache
+        self.sparse = True
+        self.vectorizer = HashingVectorizer(
+            n_features=self.n_features, alternate_sign=False, norm=None, dtype=np.float32,
+        )
+        self.df = np.zeros(self.n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.fitted = False
+        self._idf: Optional[np.ndarray] = None
+        self._model_id: Optional[str] = None
+
+    @property
+    def model_id(self) -> str:
+        if not self.fitted:
+            raise RuntimeError("Call fit() before model_id")
+        if self._model_id is None:
+            h = hashlib.blake2b(self.df.tobytes(), digest_size=12)
+            h.update(str(self.n_docs).encode())
+            self._model_id = f"hash-{self.n_features}-{h.hexdigest()}"
+        return self._model_id
+
+    def partial_fit(self, texts: List[str]):
+        """Add texts to the document-frequency statistics."""
+        if texts:
+            counts = self.vectorizer.transform(texts)
+            self.df += np.bincount(counts.indices, minlength=self.n_features)
+            self.n_docs += counts.shape[0]
+        self.fitted = True
+        self._idf = None
+        self._model_id = None
+        return self
+
+    def fit(self, texts: List[str]):
+        self.df[:] = 0
+        self.n_docs = 0
+        return self.partial_fit(texts)
+
+    def fit_stream(self, chunks: Iterable[List[str]]):
+        self.fit([])
+        for texts in chunks:
+            self.partial_fit(texts)
+        return self
+
+    @property
+    def idf(self) -> np.ndarray:
+        if self._idf is None:
+            # Same smoothing as TfidfVectorizer(smooth_idf=True).
+            self._idf = (np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0).astype(np.float32)
+        return self._idf
+
+    def _transform(self, texts: List[str], update: ProgressCb = None) -> csr_matrix:
         total = len(texts)
-        rows = []
-        for i, t in enumerate(texts, 1):
-            vec_sparse = self.vectorizer.transform([t])
-            vec = np.asarray(vec_sparse.todense()).flatten()
-            rows.append(vec)
-            if update and (i % 200 == 0 or i == total):
-                update(i, total, "Vectorizing")
-        return np.vstack(rows)
+        blocks = []
+        with metrics.span("embed", items=total, embedder="hashing"):
+            for i in range(0, total, TRANSFORM_CHUNK):
+                m = csr_matrix(self.vectorizer.transform(texts[i:i + TRANSFORM_CHUNK]))
+                m.data *= self.idf[m.indices]
+                blocks.append(normalize(m, copy=False))
+                if update:
+                    update(min(i + TRANSFORM_CHUNK, total), total, "Vectorizing")
+        if not blocks:
+            return csr_matrix((0, self.n_features), dtype=np.float32)
+        return sp_vstack(blocks, format="csr")
+
+    def _cached_transform(self, texts: List[str], update: ProgressCb = None):
+        if self.cache is None or not texts:
+            return self._transform(texts, update)
+        return csr_matrix(self.cache.embed(self.model_id, texts, lambda todo: self._transform(todo, update)))
+
+    def fit_transform(self, texts: List[str]) -> csr_matrix:
+        self.fit(texts)
+        return self._cached_transform(texts)
+
+    def embed(self, text: str) -> csr_matrix:
+        if not self.fitted:
+            raise RuntimeError("Call fit() before embed()")
+        return self._transform([text])
+
+    def embed_batch(self, texts: List[str]) -> csr_matrix:
+        return self.embed_batch_with_progress(texts)
+
+    def embed_batch_with_progress(self, texts: List[str], update: ProgressCb = None) -> csr_matrix:
+        if not self.fitted:
+            raise RuntimeError("Call fit() before embed_batch()")
+        return self._cached_transform(texts, update)
+
+    def save(self, path: str):
+        joblib.dump({"kind": "hashing", "n_features": self.n_features, "df": self.df, "n_docs": self.n_docs}, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashingEmbedder":
+        state = joblib.load(path)
+        emb = cls(n_features=state["n_features"])
+        emb.df = np.asarray(state["df"], dtype=np.int64)
+        emb.n_docs = int(state["n_docs"])
+        emb.fitted = True
+        return emb
+
+# 400 is also used for bad input, so it only counts as "too large" when the body says so.
+_SIZE_ERROR = re.compile(r"token|too (?:large|long|many|big)|maximum|context length|payload|size|limit", re.I)
+
+def _is_payload_error(resp: Optional[requests.Response]) -> bool:
+    if resp is None:
+        return False
+    if resp.status_code == 413:
+        return True
+    if resp.status_code != 400:
+        return False
+    try:
+        body = resp.text or ""
+    except Exception:
+        body = ""
+    return bool(_SIZE_ERROR.search(body))
+
+class BatchSizer:
+    """Adaptive per-request limits shared by an embedder's worker threads.
+
+    Payload errors on a multi-input batch halve the limits to below it and
+    cap them under its size; slow responses shrink the limits by a quarter.
+    Fast responses grow the limits back up to the caps, and every
+    RAISE_CAP_AFTER fast responses at the caps raise the caps a step towards
+    the configured maxima, so one failure does not pin the limits down for
+    the life of the process.
+    """
+
+    RAISE_CAP_AFTER = 32
+
+    def __init__(self, max_items: int, max_tokens: int, slow_seconds: float = EMBED_SLOW_SECONDS):
+        self.max_items = max(1, int(max_items))
+        self.max_tokens = max(1, int(max_tokens))
+        self.slow_seconds = slow_seconds
+        self.items = self.max_items
+        self.tokens = self.max_tokens
+        self.item_cap = self.max_items
+        self.token_cap = self.max_tokens
+        self._at_cap = 0
+        self._lock = threading.Lock()
+
+    def limits(self) -> Tuple[int, int]:
+        with self._lock:
+            return self.items, self.tokens
+
+    def too_large(self, items: int, tokens: int):
+        if items <= 1:
+            # A lone oversized input says nothing about the batch limits.
+            return
+        with self._lock:
+            self.items = max(1, min(self.items, items // 2))
+            self.tokens = max(1, min(self.tokens, tokens // 2))
+            self.item_cap = max(1, min(self.item_cap, items - 1))
+            self.token_cap = max(1, min(self.token_cap, tokens - 1))
+            self._at_cap = 0
+        metrics.incr("engine.embed.shrinks")
+
+    def observe(self, seconds: float):
+        with self._lock:
+            if self.slow_seconds and seconds > self.slow_seconds:
+                self.items = max(1, self.items * 3 // 4)
+                self.tokens = max(1, self.tokens * 3 // 4)
+                shrunk = True
+            else:
+                if self.items >= self.item_cap and self.tokens >= self.token_cap:
+                    self._at_cap += 1
+                    if self._at_cap >= self.RAISE_CAP_AFTER:
+                        self.item_cap = min(self.max_items, self.item_cap + max(1, self.max_items // 8))
+                        self.token_cap = min(self.max_tokens, self.token_cap + max(1, self.max_tokens // 8))
+                        self._at_cap = 0
+                self.items = min(self.item_cap, self.items + max(1, self.max_items // 8))
+                self.tokens = min(self.token_cap, self.tokens + max(1, self.max_tokens // 8))
+                shrunk = False
+        if shrunk:
+            metrics.incr("engine.embed.shrinks")
+
+def pack_batches(costs: List[int], start: int, max_items: int, max_tokens: int) -> int:
+    """End of the batch starting at start: at most max_items inputs and max_tokens tokens (never empty)."""
+    end, used = start, 0
+    while end < len(costs) and end - start < max_items:
+        if end > start and used + costs[end] > max_tokens:
+            break
+        used += costs[end]
+        end += 1
+    return end
 
 class EngineEmbedder:
-    def __init__(self, model: str = EMBEDDING_MODEL, batch: int = EMBED_BATCH):
-        self.client = EngineClient()
+    """Embeddings from the engine, in requests packed by estimated token count.
+
+    Inputs longer than max_input_tokens are truncated, or with long_inputs="split"
+    embedded piecewise and averaged (token-weighted, re-normalized). Request
+    sizes adapt through a BatchSizer.
+    """
+
+    def __init__(self,
+                 model: str = EMBEDDING_MODEL,
+                 batch: int = EMBED_BATCH,
+                 workers: int = EMBED_WORKERS,
+                 cache: Optional[EmbeddingCache] = None,
+                 client: Optional[EngineClient] = None,
+                 batch_tokens: int = EMBED_BATCH_TOKENS,
+                 max_input_tokens: int = EMBED_MAX_INPUT_TOKENS,
+                 long_inputs: str = EMBED_LONG_INPUTS):
+        self.client = client or EngineClient()
+        self.cache = cache
         self.model = model
         self.batch = max(1, int(batch))
+        self.workers = max(1, int(workers))
+        self.max_input_tokens = max(1, int(max_input_tokens))
+        self.long_inputs = long_inputs
+        self.sizer = BatchSizer(self.batch, max(int(batch_tokens), self.max_input_tokens))
         self.fitted = True
 
+    @property
+    def model_id(self) -> str:
+        return self.model
+
     def fit(self, _texts: List[str]):
         self.fitted = True
 
     def embed(self, text: str) -> np.ndarray:
-        vecs = self.client.create_embeddings(self.model, [text])
-        return np.array(vecs[0], dtype=np.float32)
+        if self.cache is not None:
+            return self.embed_batch([text])[0]
+        return self._embed_all([text])[0]
 
     def embed_batch(self, texts: List[str]) -> np.ndarray:
-        out = []
-        for i in range(0, len(texts), self.batch):
-            chunk = texts[i:i + self.batch]
-            vecs = self.client.create_embeddings(self.model, chunk)
-            out.extend(vecs)
-        return np.array(out, dtype=np.float32)
+        return self.embed_batch_with_progress(texts)
 
     def embed_batch_with_progress(self, texts: List[str], update: ProgressCb = None) -> np.ndarray:
+        if self.cache is None or not texts:
+            return self._embed_uncached(texts, update)
+        return self.cache.embed(self.model, texts, lambda todo: self._embed_uncached(todo, update))
+
+    def _embed_uncached(self, texts: List[str], update: ProgressCb = None) -> np.ndarray:
+        with metrics.span("embed", items=len(texts), embedder="engine"):
+            return self._embed_all(texts, update)
+
+    def _prepare(self, texts: List[str]) -> Tuple[List[str], List[int], List[int]]:
+        """(pieces, owning text index, token cost) with every piece within max_input_tokens."""
+        pieces, owners, costs = [], [], []
+        for n, text in enumerate(texts):
+            cost = count_tokens(text)
+            if cost <= self.max_input_tokens:
+                parts = [(text, cost)]
+            elif self.long_inputs == "split":
+                parts = [(p, count_tokens(p)) for p in split_tokens(text, self.max_input_tokens)]
+            else:
+                parts = [(truncate_tokens(text, self.max_input_tokens), self.max_input_tokens)]
+            for piece, c in parts:
+                pieces.append(piece)
+                owners.append(n)
+                costs.append(max(1, c))
+        return pieces, owners, costs
+
+    def _request(self, pieces: List[str], costs: List[int]) -> List[List[float]]:
+        """Embed one packed batch, halving it (or truncating a lone input) on payload errors."""
+        t0 = time.perf_counter()
+        try:
+            vecs = self.client.create_embeddings(self.model, pieces)
+        except requests.HTTPError as e:
+            if not _is_payload_error(e.response):
+                raise
+            self.sizer.too_large(len(pieces), sum(costs))
+            if len(pieces) > 1:
+                mid = len(pieces) // 2
+                return self._request(pieces[:mid], costs[:mid]) + self._request(pieces[mid:], costs[mid:])
+            # The token estimate can undercount; retry a single input at half its length.
+            if costs[0] <= 16:
+                raise
+            half = costs[0] // 2
+            return self._request([truncate_tokens(pieces[0], half)], [half])
+        self.sizer.observe(time.perf_counter() - t0)
+        return vecs
+
+    def _embed_all(self, texts: List[str], update: ProgressCb = None) -> np.ndarray:
         total = len(texts)
-        out = []
+        pieces, owners, costs = self._prepare(texts)
+        vectors: List[Optional[List[float]]] = [None] * len(pieces)
         done = 0
-        for i in range(0, total, self.batch):
-            chunk = texts[i:i + self.batch]
-            vecs = self.client.create_embeddings(self.model, chunk)
-            out.extend(vecs)
-            done = min(done + len(chunk), total)
-            if update:
-                update(done, total, "Embedding via engine")
-        return np.array(out, dtype=np.float32)
\ No newline at end of file
+
+        def _next_batch(start: int) -> int:
+            # Packed with the current limits, so each batch reflects what earlier responses taught.
+            items, tokens = self.sizer.limits()
+            return pack_batches(costs, start, items, tokens)
+
+        def _store(start: int, vecs: List[List[float]]) -> int:
+            end = start + len(vecs)
+            vectors[start:end] = vecs
+            # Texts completed by this batch: those whose last piece it holds.
+            return sum(1 for i in range(start, end) if i + 1 == len(owners) or owners[i + 1] != owners[i])
+
+        cursor = 0
+        if self.workers == 1:
+            while cursor < len(pieces):
+                end = _next_batch(cursor)
+                done += _store(cursor, self._request(pieces[cursor:end], costs[cursor:end]))
+                cursor = end
+                if update:
+                    update(done, total, "Embedding via engine")
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                running = {}
+                try:
+                    while cursor < len(pieces) or running:
+                        # Keep `workers` requests in flight; progress is reported from this thread
+                        # so UI callbacks stay single-threaded.
+                        while cursor < len(pieces) and len(running) < self.workers:
+                            end = _next_batch(cursor)
+                            running[pool.submit(self._request, pieces[cursor:end], costs[cursor:end])] = cursor
+                            cursor = end
+                        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            done += _store(running.pop(fut), fut.result())
+                            if update:
+                                update(done, total, "Embedding via engine")
+                except BaseException:
+                    for fut in running:
+                        fut.cancel()
+                    raise
+
+        if len(pieces) == total:
+            return np.array(vectors, dtype=np.float32)
+        # Long inputs were split: token-weighted mean of their pieces, re-normalized.
+        owner_idx = np.asarray(owners)
+        piece_vecs = np.asarray(vectors, dtype=np.float64)
+        acc = np.zeros((total, piece_vecs.shape[1]), dtype=np.float64)
+        np.add.at(acc, owner_idx, piece_vecs * np.asarray(costs, dtype=np.float64)[:, None])
+        out = normalize(acc)
+        single = np.bincount(owner_idx, minlength=total) == 1
+        out[single] = piece_vecs[np.searchsorted(owner_idx, np.flatnonzero(single))]
+        return out.astype(np.float32)
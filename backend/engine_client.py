@@ -1,39 +1,140 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Iterator, Optional
+
 import requests
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+
 from backend.config import (
     GENERATIVE_ENGINE_API_KEY,
     GENERATIVE_ENGINE_BASE_URL,
     REQUEST_TIMEOUT,
+    ENGINE_MAX_RETRIES,
+    ENGINE_BACKOFF_BASE,
+    ENGINE_BACKOFF_MAX,
+    ENGINE_POOL_SIZE,
 )
+from backend import metrics
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session shared by every EngineClient."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=ENGINE_POOL_SIZE, pool_maxsize=ENGINE_POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _session = s
+        return _session
+
+def _retry_after(resp: Optional[requests.Response]) -> Optional[float]:
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 class EngineClient:
     def __init__(self,
                  api_key: Optional[str] = None,
                  base_url: Optional[str] = None,
-                 timeout: float = REQUEST_TIMEOUT):
+                 timeout: float = REQUEST_TIMEOUT,
+                 max_retries: int = ENGINE_MAX_RETRIES,
+                 session: Optional[requests.Session] = None):
         self.api_key = api_key or GENERATIVE_ENGINE_API_KEY
         self.base_url = (base_url or GENERATIVE_ENGINE_BASE_URL).rstrip("/")
         self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
         if not self.api_key or not self.base_url:
             raise RuntimeError("EngineClient missing API key or base URL.")
 
+        self.session = session or get_session()
         self._headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
 
+    def _backoff(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        delay = _retry_after(resp)
+        if delay is None:
+            delay = ENGINE_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random() / 2)
+        return min(delay, ENGINE_BACKOFF_MAX)
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            resp = None
+            metrics.incr("engine.http.calls")
+            try:
+                resp = self.session.post(url, headers=self._headers, json=payload, timeout=self.timeout, stream=stream)
+                if resp.status_code not in RETRY_STATUS:
+                    resp.raise_for_status()
+                    return resp
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.incr("engine.http.errors")
+                if attempt >= self.max_retries:
+                    raise
+            except requests.HTTPError:
+                metrics.incr("engine.http.errors")
+                raise
+            if attempt >= self.max_retries:
+                metrics.incr("engine.http.errors")
+                resp.raise_for_status()
+            if resp is not None:
+                resp.close()
+            metrics.incr("engine.http.retries")
+            time.sleep(self._backoff(attempt, resp))
+            attempt += 1
+
     def create_embeddings(self, model: str, inputs: List[str]) -> List[List[float]]:
-        url = f"{self.base_url}/embeddings"
         payload = {"model": model, "input": inputs}
-        r = requests.post(url, headers=self._headers, json=payload, timeout=self.timeout)
-        r.raise_for_status()
-        data = r.json()
+        data = self._post("/embeddings", payload).json()
         return [item["embedding"] for item in data["data"]]
 
-    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
-        url = f"{self.base_url}/chat/completions"
+    def chat(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.2,
+             max_tokens: Optional[int] = None) -> str:
         payload = {"model": model, "messages": messages, "temperature": temperature}
-        r = requests.post(url, headers=self._headers, json=payload, timeout=self.timeout)
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"]
\ No newline at end of file
+        if max_tokens:
+            payload["max_tokens"] = int(max_tokens)
+        data = self._post("/chat/completions", payload).json()
+        return data["choices"][0]["message"]["content"]
+
+    def chat_stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.2) -> Iterator[str]:
+        """Yield content deltas from a server-sent-events completion as they arrive.
+
+        Retries only cover the request itself; once tokens flow, errors propagate.
+        """
+        payload = {"model": model, "messages": messages, "temperature": temperature, "stream": True}
+        resp = self._post("/chat/completions", payload, stream=True)
+        try:
+            # SSE is UTF-8 by spec; requests would guess latin-1 for text/event-stream.
+            for raw in resp.iter_lines(chunk_size=None):
+                line = raw.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                for choice in chunk.get("choices") or []:
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        yield piece
+        finally:
+            resp.close()
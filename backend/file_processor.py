@@ -1,30 +1,48 @@
+import codecs
+import glob
+import hashlib
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import pandas as pd
-from bs4 import BeautifulSoup
-from backend.config import CSV_PATH
+from backend.config import CSV_PATH, FRAME_CACHE_DIR
+from backend.html_extract import html_to_text, extract_texts
+from backend import metrics
 
 REQUIRED_ANY_TEXT_COLS = {"Resume_html", "Resume_str"}
 REQUIRED_ID_COL = "ID"
 
-def html_to_text(html: str) -> str:
-    try:
-        soup = BeautifulSoup(html or "", "html.parser")
-        for tag in soup(["script", "style"]):
-            tag.decompose()
-        text = soup.get_text(separator=" ", strip=True)
-        return " ".join(text.split())
-    except Exception:
-        return ""
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
-def _read_any(path: str) -> pd.DataFrame:
-    import pandas as pd
-    import os
+SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = [",", ";", "\t", "|"]
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
 
-    ext = os.path.splitext(path.lower())[1]
-    if ext in (".xlsx", ".xls"):
-        return pd.read_excel(path, engine="openpyxl")
+def _sniff_csv(sample: bytes) -> Tuple[str, str]:
+    """Guess (encoding, delimiter) from the first bytes of a CSV file."""
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        encoding = "latin1"
+        for enc in ("utf-8", "cp1252"):
+            try:
+                # Incremental decoding tolerates a sample cut mid-character.
+                codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+
+    header = sample.decode(encoding, errors="ignore").lstrip("\ufeff").splitlines()[:1]
+    counts = {d: (header[0].count(d) if header else 0) for d in CSV_DELIMITERS}
+    sep = max(CSV_DELIMITERS, key=lambda d: counts[d])
+    return encoding, (sep if counts[sep] else ",")
 
+def _read_csv_fallback(path: str) -> pd.DataFrame:
     encodings = ["utf-8-sig", "utf-8", "cp1252", "latin1"]
     try_orders = [
         dict(sep=None, engine="python"),
@@ -38,22 +56,7 @@ def _read_any(path: str) -> pd.DataFrame:
     for enc in encodings:
         for opts in try_orders:
             try:
-                # Remove low_memory when using engine="python"
-                if opts.get("engine") == "python":
-                    return pd.read_csv(
-                        path,
-                        on_bad_lines="skip",
-                        encoding=enc,
-                        **opts,
-                    )
-                else:
-                    return pd.read_csv(
-                        path,
-                        low_memory=False,
-                        on_bad_lines="skip",
-                        encoding=enc,
-                        **opts,
-                    )
+                return pd.read_csv(path, on_bad_lines="skip", encoding=enc, **opts)
             except Exception as e:
                 last_err = e
 
@@ -62,6 +65,67 @@ def _read_any(path: str) -> pd.DataFrame:
     except Exception:
         raise last_err or RuntimeError("Unable to read file with any strategy")
 
+def _read_any(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path.lower())[1]
+    with open(path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+
+    if ext in (".xlsx", ".xls") or sample.startswith((XLSX_MAGIC, XLS_MAGIC)):
+        return pd.read_excel(path, engine="openpyxl")
+
+    encoding, sep = _sniff_csv(sample)
+    try:
+        # The C engine copes with quoted multi-line HTML cells; pyarrow's reader does not.
+        return pd.read_csv(
+            path,
+            sep=sep,
+            encoding=encoding,
+            engine="c",
+            low_memory=False,
+            on_bad_lines="skip",
+        )
+    except Exception:
+        return _read_csv_fallback(path)
+
+def iter_frames(path: str, chunk_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """Normalized frames of at most chunk_rows rows, read incrementally for CSV files.
+
+    Excel workbooks cannot be streamed; they are read once and sliced.
+    """
+    ext = os.path.splitext(path.lower())[1]
+    with open(path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+
+    if ext in (".xlsx", ".xls") or sample.startswith((XLSX_MAGIC, XLS_MAGIC)):
+        df = _normalize_cols(pd.read_excel(path, engine="openpyxl"))
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+        return
+
+    encoding, sep = _sniff_csv(sample)
+    reader = pd.read_csv(
+        path,
+        sep=sep,
+        encoding=encoding,
+        engine="c",
+        on_bad_lines="skip",
+        chunksize=chunk_rows,
+    )
+    with reader:
+        for chunk in reader:
+            yield _normalize_cols(chunk)
+
+def id_key(value) -> str:
+    """Canonical candidate ID as a string: 710, 710.0 and " 710 " map to "710".
+
+    pandas infers the ID column per file (or per CSV chunk) and turns it into
+    float64 as soon as one ID is missing; only such integral floats are
+    rewritten. Strings are kept as they are ("0012" stays "0012").
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
 def _normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
     colmap = {c: c.lower() for c in df.columns}
     df.columns = [c.lower() for c in df.columns]
@@ -91,6 +155,43 @@ def _normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
     if cat_col: out["Category"]    = df[cat_col]
     return out
 
+def _sidecar_path(path: str) -> Optional[str]:
+    """Parquet cache file for the normalized frame of (path, mtime, size)."""
+    if not HAS_PYARROW or not FRAME_CACHE_DIR:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    apath = os.path.abspath(path)
+    prefix = hashlib.blake2b(apath.encode(), digest_size=8).hexdigest()
+    version = hashlib.blake2b(f"{st.st_mtime_ns}|{st.st_size}".encode(), digest_size=8).hexdigest()
+    return os.path.join(FRAME_CACHE_DIR, f"{prefix}-{version}.parquet")
+
+def _read_normalized(path: str) -> pd.DataFrame:
+    sidecar = _sidecar_path(path)
+    if sidecar and os.path.exists(sidecar):
+        try:
+            return pd.read_parquet(sidecar)
+        except Exception:
+            pass
+
+    df = _normalize_cols(_read_any(path))
+    if sidecar and len(df.columns):
+        prefix = os.path.basename(sidecar).split("-")[0]
+        try:
+            os.makedirs(FRAME_CACHE_DIR, exist_ok=True)
+            tmp = f"{sidecar}.tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, sidecar)
+            for stale in glob.glob(os.path.join(FRAME_CACHE_DIR, f"{prefix}-*.parquet")):
+                if stale != sidecar:
+                    os.remove(stale)
+        except Exception:
+            # Mixed-type columns (e.g. int and str IDs) cannot be stored; just skip the cache.
+            pass
+    return df
+
 def _row_to_record(row: pd.Series) -> Dict:
     rid = row.get("ID")
     html = row.get("Resume_html")
@@ -107,6 +208,59 @@ def _row_to_record(row: pd.Series) -> Dict:
         "Resume_str": text,
     }
 
+def _non_empty_mask(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(False, index=df.index)
+    s = df[col]
+    return s.notna() & s.astype(str).str.strip().ne("")
+
+def _column_values(df: pd.DataFrame, col: str, mask: pd.Series) -> List:
+    if col not in df.columns:
+        return [None] * int(mask.sum())
+    return df.loc[mask, col].tolist()
+
+def _columnar_records(df: pd.DataFrame) -> Tuple[List[Dict], Dict[str, int]]:
+    """Whole-column equivalent of iterating rows through _row_to_record."""
+    id_ok = _non_empty_mask(df, "ID")
+    html_ok = _non_empty_mask(df, "Resume_html")
+    str_ok = _non_empty_mask(df, "Resume_str")
+    any_ok = html_ok | str_ok
+
+    counts = {
+        "rows_with_any_text": int(any_ok.sum()),
+        "rows_missing_id": int((~id_ok).sum()),
+        "html_non_empty": int(html_ok.sum()),
+        "str_non_empty": int(str_ok.sum()),
+    }
+
+    # Rows with an empty-string ID are kept, only NaN IDs are dropped.
+    keep = df["ID"].notna() & any_ok
+    ids = _column_values(df, "ID", keep)
+    cats = _column_values(df, "Category", keep)
+    htmls = _column_values(df, "Resume_html", keep)
+    use_str = str_ok[keep].tolist()
+
+    if "Resume_str" in df.columns:
+        strs = df.loc[keep, "Resume_str"].astype(str).str.strip().tolist()
+    else:
+        strs = [""] * len(ids)
+
+    htmls = ["" if pd.isna(h) else str(h) for h in htmls]
+    fallback = iter(extract_texts([h for h, ok in zip(htmls, use_str) if not ok]))
+
+    records: List[Dict] = []
+    for rid, cat, html, sstr, has_str in zip(ids, cats, htmls, strs, use_str):
+        text = sstr if has_str else next(fallback)
+        if not text:
+            continue
+        records.append({
+            "ID": rid,
+            "Category": "" if pd.isna(cat) else str(cat),
+            "Resume_html": html,
+            "Resume_str": text,
+        })
+    return records, counts
+
 def load_resumes_with_stats(path: str | None = None) -> Tuple[List[Dict], Dict]:
 
     p = path or CSV_PATH
@@ -121,7 +275,9 @@ def load_resumes_with_stats(path: str | None = None) -> Tuple[List[Dict], Dict]:
         }
 
     try:
-        df_raw = _read_any(p)
+        with metrics.span("load", bytes=os.path.getsize(p)) as s:
+            df = _read_normalized(p)
+            s.set(items=len(df))
     except Exception as e:
         return [], {
             "total_rows_raw": 0,
@@ -133,8 +289,6 @@ def load_resumes_with_stats(path: str | None = None) -> Tuple[List[Dict], Dict]:
             "error": f"Failed to read file: {type(e).__name__}: {e}"
         }
 
-    df = _normalize_cols(df_raw)
-
     total = len(df)
     if total == 0:
         return [], {
@@ -161,43 +315,20 @@ def load_resumes_with_stats(path: str | None = None) -> Tuple[List[Dict], Dict]:
             "error": "Missing required columns (need ID and one of Resume_html/Resume_str)",
         }
 
-    html_non_empty = 0
-    str_non_empty = 0
-    any_text = 0
-    missing_id = 0
-
-    def _non_empty(v) -> bool:
-        return not pd.isna(v) and str(v).strip() != ""
-
-    for _, r in df.iterrows():
-        if not _non_empty(r.get("ID")):
-            missing_id += 1
-        html_non_empty += 1 if _non_empty(r.get("Resume_html")) else 0
-        str_non_empty += 1 if _non_empty(r.get("Resume_str")) else 0
-        if _non_empty(r.get("Resume_str")) or _non_empty(r.get("Resume_html")):
-            any_text += 1
-
-    records: List[Dict] = []
-    for _, r in df.iterrows():
-        if pd.isna(r.get("ID")):
-            continue
-        has_str_val = _non_empty(r.get("Resume_str"))
-        has_html_val = _non_empty(r.get("Resume_html"))
-        if not (has_str_val or has_html_val):
-            continue
-        rec = _row_to_record(r)
-        if rec["Resume_str"]:
-            records.append(rec)
+    with metrics.span("parse", items=total) as s:
+        records, counts = _columnar_records(df)
+        s.set(records=len(records))
+    any_text = counts["rows_with_any_text"]
 
     stats = {
         "total_rows_raw": int(total),
         "rows_with_any_text": int(any_text),
         "rows_without_any_text": int(total - any_text),
-        "rows_missing_id": int(missing_id),
+        "rows_missing_id": counts["rows_missing_id"],
         "rows_used": int(len(records)),
         "source_path": p,
-        "html_non_empty": int(html_non_empty),
-        "str_non_empty": int(str_non_empty),
+        "html_non_empty": counts["html_non_empty"],
+        "str_non_empty": counts["str_non_empty"],
     }
     return records, stats
 
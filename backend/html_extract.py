@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from bs4 import BeautifulSoup
+from backend.config import HTML_CACHE_PATH, HTML_WORKERS
+from backend import metrics
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Below this many cache misses a process pool costs more than it saves.
+POOL_MIN_ITEMS = 2000
+SQLITE_MAX_VARS = 900
+
+def html_to_text(html: str) -> str:
+    try:
+        soup = BeautifulSoup(html or "", HTML_PARSER)
+        for tag in soup(["script", "style"]):
+            tag.decompose()
+        text = soup.get_text(separator=" ", strip=True)
+        return " ".join(text.split())
+    except Exception:
+        return ""
+
+def content_key(html: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(HTML_PARSER.encode())
+    h.update(b"\0")
+    h.update(html.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+class HtmlTextCache:
+    """SQLite map of content_key -> extracted text, shared across reloads."""
+
+    def __init__(self, path: str = HTML_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS html_text (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        with self._connect() as con:
+            for i in range(0, len(keys), SQLITE_MAX_VARS):
+                chunk = keys[i:i + SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(chunk))
+                rows = con.execute(f"SELECT key, text FROM html_text WHERE key IN ({marks})", chunk)
+                found.update(rows)
+        return found
+
+    def put_many(self, items: Dict[str, str]):
+        if not items:
+            return
+        with self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO html_text (key, text) VALUES (?, ?)", items.items())
+
+def _parse_all(htmls: List[str], workers: int) -> List[str]:
+    if workers <= 1 or len(htmls) < POOL_MIN_ITEMS:
+        return [html_to_text(h) for h in htmls]
+    chunksize = max(1, len(htmls) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(html_to_text, htmls, chunksize=chunksize))
+
+def extract_texts(
+    htmls: List[str],
+    workers: int = HTML_WORKERS,
+    cache_path: Optional[str] = HTML_CACHE_PATH,
+) -> List[str]:
+    """html_to_text over many documents, parsing each distinct, uncached one once."""
+    if not htmls:
+        return []
+    workers = workers or os.cpu_count() or 1
+    keys = [content_key(h) for h in htmls]
+
+    cache = None
+    known: Dict[str, str] = {}
+    if cache_path:
+        try:
+            cache = HtmlTextCache(cache_path)
+            known = cache.get_many(set(keys))
+        except sqlite3.Error:
+            cache = None
+
+    todo: Dict[str, str] = {}
+    for k, h in zip(keys, htmls):
+        if k not in known and k not in todo:
+            todo[k] = h
+    metrics.incr("html_cache.hits", len(known))
+    metrics.incr("html_cache.misses", len(todo))
+    if todo:
+        with metrics.span("html_extract", items=len(todo)):
+            parsed = dict(zip(todo.keys(), _parse_all(list(todo.values()), workers)))
+        known.update(parsed)
+        if cache is not None:
+            try:
+                cache.put_many(parsed)
+            except sqlite3.Error:
+                pass
+    return [known[k] for k in keys]
@@ -0,0 +1,382 @@
+"""Headless, pipelined ingestion into ChromaDB.
+
+    python -m backend.ingest --source data/uploads/csv/Resume.csv
+    python -m backend.ingest --source Resume.csv --engine --prune
+    python -m backend.ingest --source huge.csv --hashing
+
+Reading, HTML extraction, embedding and indexing run as concurrent stages
+connected by bounded queues, so at most a few chunks are in memory at once.
+After every indexed chunk a checkpoint is written; a rerun over the same,
+unchanged file resumes after the last committed chunk, and a rerun after the
+file changed only re-embeds records whose content_hash differs.
+
+With --dedup (DEDUP_ENABLED) near-duplicate resumes are clustered exactly as
+the app does (backend.dedup): only representatives are indexed and other
+cluster members are removed from the collection, so the CLI and the UI keep
+the same set of IDs. On resume the committed chunks are re-read (not
+re-embedded) to rebuild the clusters. The clusters stay in memory (a few KB
+per distinct resume), so memory then grows with the file.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from backend.config import (
+    CSV_PATH,
+    EMBEDDING_MODEL,
+    USE_ENGINE_EMBEDDINGS,
+    INGEST_STATE_DIR,
+    INGEST_CHUNK_ROWS,
+    INGEST_QUEUE_DEPTH,
+    INGEST_FIT_ROWS,
+    OFFLINE_LSA_DIM,
+    DEDUP_ENABLED,
+)
+from backend.dedup import RecordClusters
+from backend.embedding_cache import EmbeddingCache
+from backend.embeddings import OfflineEmbedder, EngineEmbedder, HashingEmbedder
+from backend.file_processor import id_key, iter_frames, _columnar_records
+from backend.vector_store import (
+    COLLECTION,
+    content_hash,
+    get_client,
+    get_collection,
+    reset_collection,
+    stored_hashes_for,
+    upsert_records,
+    _stored_dimension,
+    _stored_hashes,
+)
+
+STATE_VERSION = 1
+_DONE = object()
+_POLL_SEC = 0.2
+
+def _log(msg: str, quiet: bool = False):
+    if not quiet:
+        print(f"[ingest {time.strftime('%H:%M:%S')}] {msg}", file=sys.stderr, flush=True)
+
+def _state_paths(source: str, collection: str, state_dir: str):
+    key = hashlib.blake2b(f"{os.path.abspath(source)}|{collection}".encode(), digest_size=8).hexdigest()
+    return os.path.join(state_dir, f"{key}.json"), os.path.join(state_dir, f"{key}.embedder")
+
+def _source_signature(source: str) -> Dict:
+    st = os.stat(source)
+    return {"source": os.path.abspath(source), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def _load_state(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+def _save_state(path: str, state: Dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def _has_required_columns(df) -> bool:
+    return "ID" in df.columns and ("Resume_html" in df.columns or "Resume_str" in df.columns)
+
+def stream_texts(source: str, chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[List[str]]:
+    """Resume texts of source, one list per chunk of rows."""
+    for df in iter_frames(source, chunk_rows):
+        if not _has_required_columns(df):
+            return
+        records, _ = _columnar_records(df)
+        yield [r["Resume_str"] for r in records]
+
+def _fit_hashing(source: str, chunk_rows: int, quiet: bool) -> HashingEmbedder:
+    """Document frequencies over the whole source in one streaming pass."""
+    emb = HashingEmbedder(cache=EmbeddingCache()).fit_stream(stream_texts(source, chunk_rows))
+    if not emb.n_docs:
+        raise ValueError("No usable resumes to fit the hashing embedder on")
+    _log(f"accumulated IDF over {emb.n_docs:,} records ({emb.model_id})", quiet)
+    return emb
+
+def _fit_offline(source: str, chunk_rows: int, fit_rows: int, lsa_dim: int, quiet: bool) -> OfflineEmbedder:
+    """Fit TF-IDF on the first fit_rows records; extracted HTML lands in the text cache for the main pass."""
+    texts: List[str] = []
+    for df in iter_frames(source, chunk_rows):
+        if not _has_required_columns(df):
+            break
+        records, _ = _columnar_records(df)
+        texts.extend(r["Resume_str"] for r in records)
+        if len(texts) >= fit_rows:
+            break
+    if not texts:
+        raise ValueError("No usable resumes to fit the offline embedder on")
+    emb = OfflineEmbedder(sparse=True, cache=EmbeddingCache(), lsa_dim=lsa_dim)
+    emb.fit(texts[:fit_rows])
+    _log(f"fitted offline embedder on {min(len(texts), fit_rows):,} records ({emb.model_id})", quiet)
+    return emb
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while True:
+        try:
+            return q.get(timeout=_POLL_SEC)
+        except queue.Empty:
+            if stop.is_set():
+                return _DONE
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SEC)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _stage(name: str, fn: Callable, inbox: queue.Queue, outbox: Optional[queue.Queue],
+           stop: threading.Event, errors: List):
+    try:
+        while True:
+            item = _get(inbox, stop)
+            if item is _DONE:
+                break
+            result = fn(item)
+            if result is None:
+                continue
+            if outbox is not None and not _put(outbox, result, stop):
+                break
+    except BaseException as e:
+        errors.append((name, e))
+        stop.set()
+    finally:
+        if outbox is not None:
+            _put(outbox, _DONE, stop)
+
+def run_ingest(
+    source: str = CSV_PATH,
+    use_engine: bool = USE_ENGINE_EMBEDDINGS,
+    model: str = EMBEDDING_MODEL,
+    collection: str = COLLECTION,
+    chunk_rows: int = INGEST_CHUNK_ROWS,
+    queue_depth: int = INGEST_QUEUE_DEPTH,
+    fit_rows: int = INGEST_FIT_ROWS,
+    hashing: bool = False,
+    lsa_dim: int = OFFLINE_LSA_DIM,
+    restart: bool = False,
+    refit: bool = False,
+    prune: bool = False,
+    dedup: bool = DEDUP_ENABLED,
+    client=None,
+    state_dir: str = INGEST_STATE_DIR,
+    quiet: bool = False,
+) -> Dict:
+    """Stream source into the collection; returns the run stats (also kept in the checkpoint)."""
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+    os.makedirs(state_dir, exist_ok=True)
+    state_path, embedder_path = _state_paths(source, collection, state_dir)
+    sig = _source_signature(source)
+
+    state = None if restart else _load_state(state_path)
+    embedder = None
+    if use_engine:
+        embedder = EngineEmbedder(model=model, cache=EmbeddingCache())
+    elif not (restart or refit) and os.path.exists(embedder_path):
+        # Keeping the fitted vocabulary across runs keeps content hashes stable,
+        # so a changed file only re-embeds the records that changed.
+        try:
+            embedder = (HashingEmbedder if hashing else OfflineEmbedder).load(embedder_path)
+            embedder.cache = EmbeddingCache()
+            if not hashing and embedder.lsa_dim != lsa_dim:
+                embedder = None
+        except Exception:
+            state, embedder = None, None
+
+    if state and (state.get("signature") != sig or state.get("chunk_rows") != chunk_rows
+                  or state.get("dedup", False) != dedup
+                  or embedder is None or state.get("model_id") != embedder.model_id):
+        state = None
+    if state and state.get("complete") and not prune:
+        _log(f"{source} unchanged since last complete run, nothing to do", quiet)
+        return dict(state["stats"], skipped=True)
+
+    if embedder is None:
+        if hashing:
+            embedder = _fit_hashing(source, chunk_rows, quiet)
+        else:
+            embedder = _fit_offline(source, chunk_rows, fit_rows, lsa_dim, quiet)
+        embedder.save(embedder_path)
+    tag = embedder.model_id
+
+    client = client or get_client()
+    dimension = embedder.embed_batch(["dimension probe"]).shape[1]
+    if _stored_dimension(get_collection(client, collection)) not in (None, dimension):
+        reset_collection(client, collection)
+        state = None
+    done_chunks = state["chunks_done"] if state else 0
+    stats = dict(state["stats"]) if state else {
+        "rows_read": 0, "records": 0, "added": 0, "updated": 0, "unchanged": 0, "deleted": 0,
+        "near_duplicates": 0,
+    }
+    if done_chunks:
+        _log(f"resuming after chunk {done_chunks} ({stats['rows_read']:,} rows)", quiet)
+    state = {
+        "version": STATE_VERSION, "signature": sig, "chunk_rows": chunk_rows, "model_id": tag,
+        "collection": collection, "chunks_done": done_chunks, "complete": False, "stats": stats,
+        "dedup": dedup,
+    }
+    _save_state(state_path, state)
+
+    stop = threading.Event()
+    errors: List = []
+    seen_ids = set() if prune else None
+    clusters = RecordClusters(key_of=lambda r: id_key(r["ID"])) if dedup else None
+    q_frames, q_records, q_vectors = (queue.Queue(maxsize=max(1, queue_depth)) for _ in range(3))
+
+    def read():
+        try:
+            for n, df in enumerate(iter_frames(source, chunk_rows)):
+                if n == 0 and not _has_required_columns(df):
+                    raise ValueError("Missing required columns (need ID and one of Resume_html/Resume_str)")
+                if seen_ids is not None and "ID" in df.columns:
+                    seen_ids.update(id_key(v) for v in df["ID"].dropna().tolist())
+                if n < done_chunks and clusters is None:
+                    continue
+                if not _put(q_frames, (n, df), stop):
+                    break
+        except BaseException as e:
+            errors.append(("read", e))
+            stop.set()
+        finally:
+            _put(q_frames, _DONE, stop)
+
+    def extract(item):
+        n, df = item
+        records, _ = _columnar_records(df)
+        duplicates: List[str] = []
+        if clusters is not None:
+            reps = []
+            for r in records:
+                if clusters.add(r)[1]:
+                    reps.append(r)
+                else:
+                    duplicates.append(id_key(r["ID"]))
+            if n < done_chunks:
+                # Committed chunk: only replayed to rebuild the clusters.
+                return None
+            records = reps
+        return n, len(df), records, duplicates
+
+    def embed(item):
+        n, rows, records, duplicates = item
+        # Later duplicates of an ID win, matching upsert semantics.
+        latest = {id_key(r["ID"]): r for r in records}
+        col = get_collection(client, collection)
+        stored = stored_hashes_for(col, list(latest))
+        changed = [r for cid, r in latest.items() if stored.get(cid) != content_hash(r, tag)]
+        vectors = embedder.embed_batch([r["Resume_str"] for r in changed]) if changed else None
+        added = sum(1 for r in changed if id_key(r["ID"]) not in stored)
+        # Near-duplicates indexed by an earlier run (or without dedup) are removed.
+        dup_ids = [cid for cid in duplicates if cid not in latest]
+        stale = list(stored_hashes_for(col, dup_ids)) if dup_ids else []
+        counts = {"added": added, "updated": len(changed) - added, "unchanged": len(latest) - len(changed),
+                  "deleted": len(stale), "near_duplicates": len(duplicates)}
+        return n, rows, len(records) + len(duplicates), changed, vectors, stale, counts
+
+    def index(item):
+        n, rows, n_records, changed, vectors, stale, counts = item
+        col = get_collection(client, collection)
+        upsert_records(col, changed, vectors, tag)
+        if stale:
+            col.delete(ids=stale)
+        stats["rows_read"] += rows
+        stats["records"] += n_records
+        for k, v in counts.items():
+            stats[k] = stats.get(k, 0) + v
+        state["chunks_done"] = n + 1
+        _save_state(state_path, state)
+        _log(f"chunk {n + 1}: {stats['rows_read']:,} rows, +{counts['added']} "
+             f"~{counts['updated']} ={counts['unchanged']}", quiet)
+
+    threads = [
+        threading.Thread(target=read, name="ingest-read", daemon=True),
+        threading.Thread(target=_stage, args=("extract", extract, q_frames, q_records, stop, errors),
+                         name="ingest-extract", daemon=True),
+        threading.Thread(target=_stage, args=("embed", embed, q_records, q_vectors, stop, errors),
+                         name="ingest-embed", daemon=True),
+        threading.Thread(target=_stage, args=("index", index, q_vectors, None, stop, errors),
+                         name="ingest-index", daemon=True),
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=_POLL_SEC)
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+        raise
+    if errors:
+        name, err = errors[0]
+        raise RuntimeError(f"ingest stage '{name}' failed: {type(err).__name__}: {err}") from err
+
+    if prune:
+        col = get_collection(client, collection)
+        removed = [cid for cid in _stored_hashes(col, 1000) if cid not in seen_ids]
+        for start in range(0, len(removed), 1000):
+            col.delete(ids=removed[start:start + 1000])
+        stats["deleted"] += len(removed)
+
+    stats["total"] = get_collection(client, collection).count()
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    state["complete"] = True
+    _save_state(state_path, state)
+    _log(f"done in {stats['seconds']}s: {stats}", quiet)
+    return stats
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m backend.ingest", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--source", default=CSV_PATH, help="CSV/XLSX export to ingest")
+    ap.add_argument("--engine", action="store_true", default=USE_ENGINE_EMBEDDINGS,
+                    help="embed via the generative engine instead of offline TF-IDF")
+    ap.add_argument("--model", default=EMBEDDING_MODEL, help="engine embedding model")
+    ap.add_argument("--collection", default=COLLECTION)
+    ap.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS)
+    ap.add_argument("--queue-depth", type=int, default=INGEST_QUEUE_DEPTH)
+    ap.add_argument("--fit-rows", type=int, default=INGEST_FIT_ROWS,
+                    help="records used to fit the offline TF-IDF vocabulary")
+    ap.add_argument("--hashing", action="store_true",
+                    help="out-of-core offline embedder: feature hashing + IDF accumulated over the whole file")
+    ap.add_argument("--lsa-dim", type=int, default=OFFLINE_LSA_DIM,
+                    help="project offline TF-IDF to this many dense LSA components (0: keep sparse TF-IDF)")
+    ap.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    ap.add_argument("--refit", action="store_true", help="refit the offline TF-IDF vocabulary")
+    ap.add_argument("--prune", action="store_true", help="delete IDs that are no longer in the source")
+    ap.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=DEDUP_ENABLED,
+                    help="index one representative per near-duplicate cluster (memory grows with the file)")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    try:
+        stats = run_ingest(
+            source=args.source, use_engine=args.engine, model=args.model, collection=args.collection,
+            chunk_rows=args.chunk_rows, queue_depth=args.queue_depth, fit_rows=args.fit_rows,
+            hashing=args.hashing, lsa_dim=args.lsa_dim,
+            restart=args.restart, refit=args.refit, prune=args.prune, dedup=args.dedup,
+            quiet=args.quiet,
+        )
+    except Exception as e:
+        _log(f"failed: {e}")
+        return 1
+    print(json.dumps(stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.sparse import csc_matrix
+from sklearn.feature_extraction.text import CountVectorizer
+
+from backend.file_processor import id_key
+from backend.vector_store import DEFAULT_DIR, get_documents
+from backend import metrics
+
+BM25_PATH = os.path.join(DEFAULT_DIR, "bm25.npz")
+# Keeps tokens like "c++", "c#" and "node.js" intact.
+TOKEN_PATTERN = r"(?u)\b\w[\w+#]*(?:\.\w+)*[+#]*"
+RRF_K = 60
+
+class BM25Index:
+    """Okapi BM25 over Resume_str with term-major postings.
+
+    Postings are stored CSC-style: for term t, docs[ptr[t]:ptr[t+1]] are row
+    numbers (int32) and tfs[...] the in-document counts (uint16).
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], ptr: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                 doc_len: np.ndarray, ids: List[str], categories: List[str],
+                 k1: float = 1.5, b: float = 0.75, signature: str = ""):
+        self.vocabulary = vocabulary
+        self.ptr = ptr
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.ids = ids
+        self.categories = categories
+        self.k1 = k1
+        self.b = b
+        self.signature = signature
+        self.documents: Optional[List[str]] = None
+        n = len(ids)
+        self.avgdl = float(doc_len.mean()) if n else 0.0
+        df = np.diff(ptr)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self._analyzer = CountVectorizer(token_pattern=TOKEN_PATTERN).build_analyzer()
+        cats = np.asarray(categories, dtype=object)
+        self.masks = {c: cats == c for c in set(categories)}
+
+    @classmethod
+    def build(cls, records: List[Dict], signature: str = "", **params) -> "BM25Index":
+        cv = CountVectorizer(token_pattern=TOKEN_PATTERN, dtype=np.int32)
+        texts = [r["Resume_str"] for r in records]
+        if texts:
+            counts = csc_matrix(cv.fit_transform(texts))
+            vocabulary = {t: int(i) for t, i in cv.vocabulary_.items()}
+        else:
+            counts = csc_matrix((0, 0), dtype=np.int32)
+            vocabulary = {}
+        index = cls(
+            vocabulary=vocabulary,
+            ptr=counts.indptr.astype(np.int64),
+            docs=counts.indices.astype(np.int32),
+            tfs=np.minimum(counts.data, np.iinfo(np.uint16).max).astype(np.uint16),
+            doc_len=np.asarray(counts.sum(axis=1)).ravel().astype(np.int32),
+            ids=[id_key(r["ID"]) for r in records],
+            categories=[r.get("Category", "") for r in records],
+            signature=signature,
+            **params,
+        )
+        index.documents = texts
+        return index
+
+    def save(self, path: str = BM25_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        meta = {"k1": self.k1, "b": self.b, "signature": self.signature}
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            ptr=self.ptr, docs=self.docs, tfs=self.tfs, doc_len=self.doc_len,
+            terms=np.asarray(terms, dtype=str),
+            ids=np.asarray(self.ids, dtype=str),
+            categories=np.asarray(self.categories, dtype=str),
+            meta=np.asarray(json.dumps(meta)),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_PATH, signature: Optional[str] = None) -> Optional["BM25Index"]:
+        """Index stored at path, or None if it is missing or built for another signature."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                meta = json.loads(str(z["meta"]))
+                if signature is not None and meta.get("signature") != signature:
+                    return None
+                return cls(
+                    vocabulary={t: i for i, t in enumerate(z["terms"].tolist())},
+                    ptr=z["ptr"], docs=z["docs"], tfs=z["tfs"], doc_len=z["doc_len"],
+                    ids=z["ids"].tolist(), categories=z["categories"].tolist(),
+                    k1=meta["k1"], b=meta["b"], signature=meta.get("signature", ""),
+                )
+        except Exception:
+            return None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def tokenize(self, text: str) -> List[str]:
+        return self._analyzer(text or "")
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros(len(self.ids), dtype=np.float32)
+        if not len(self.ids):
+            return out
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))
+        for term in set(self.tokenize(query)):
+            t = self.vocabulary.get(term)
+            if t is None:
+                continue
+            a, z = self.ptr[t], self.ptr[t + 1]
+            docs = self.docs[a:z]
+            tf = self.tfs[a:z].astype(np.float32)
+            out[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + norm[docs])
+        return out
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        cond = where.get("Category")
+        if cond is None or len(where) != 1:
+            raise ValueError("BM25Index only filters on Category")
+        values = cond.get("$in", [cond.get("$eq")]) if isinstance(cond, dict) else [cond]
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for v in values:
+            if v in self.masks:
+                mask |= self.masks[v]
+        return mask
+
+    def search(self, query: str, top_k: int = 10, where: Optional[Dict] = None, client=None) -> List[Dict]:
+        """Hits in the vector_store.query shape; distance is None and score holds BM25."""
+        with metrics.span("query", items=1, backend="bm25"):
+            scores = self.scores(query)
+            mask = self._mask(where)
+            if mask is not None:
+                scores[~mask] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        k = min(top_k, len(candidates))
+        if k == 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        if self.documents is not None:
+            docs = {self.ids[i]: self.documents[i] for i in top}
+        else:
+            docs = get_documents([self.ids[i] for i in top], client=client)
+        return [
+            {
+                "id": self.ids[i],
+                "document": docs.get(self.ids[i], ""),
+                "metadata": {"Category": self.categories[i]},
+                "distance": None,
+                "score": float(scores[i]),
+            }
+            for i in top
+        ]
+
+def reciprocal_rank_fusion(hit_lists: Sequence[List[Dict]], top_k: int = 10, k: int = RRF_K) -> List[Dict]:
+    """Merge ranked hit lists by sum of 1 / (k + rank), preferring hit copies that carry a distance."""
+    fused: Dict[str, float] = {}
+    first: Dict[str, Dict] = {}
+    for hits in hit_lists:
+        for rank, h in enumerate(hits, 1):
+            fused[h["id"]] = fused.get(h["id"], 0.0) + 1.0 / (k + rank)
+            if h["id"] not in first or first[h["id"]].get("distance") is None:
+                first[h["id"]] = h
+    order = sorted(fused, key=lambda cid: -fused[cid])[:top_k]
+    return [dict(first[cid], rrf_score=fused[cid]) for cid in order]
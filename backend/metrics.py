@@ -0,0 +1,213 @@
+"""Lightweight stage timing and counters.
+
+    with metrics.span("embed", items=len(texts)):
+        ...
+    metrics.incr("engine.http.retries")
+
+When disabled (the default, see METRICS_ENABLED) span() returns a shared
+no-op context manager and incr() returns immediately, so instrumented code
+pays one attribute check. snapshot() exposes the data to Python callers,
+prometheus_text()/start_prometheus_server() serve it in Prometheus text
+format, and enable_otel() mirrors spans and counters to OpenTelemetry when
+opentelemetry-api is installed.
+"""
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend.config import METRICS_ENABLED, METRICS_OTEL, METRICS_PROMETHEUS_PORT
+
+RECENT_SPANS = 500
+
+_enabled = METRICS_ENABLED
+_lock = threading.Lock()
+_stages: Dict[str, Dict[str, float]] = {}
+_counters: Dict[str, float] = {}
+_recent: deque = deque(maxlen=RECENT_SPANS)
+_otel_tracer = None
+_otel_meter = None
+_otel_counters: Dict[str, Any] = {}
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "items", "bytes", "attrs", "_t0", "_otel")
+
+    def __init__(self, name: str, items: Optional[int], nbytes: Optional[int], attrs: Dict[str, Any]):
+        self.name = name
+        self.items = items
+        self.bytes = nbytes
+        self.attrs = attrs
+        self._otel = None
+
+    def set(self, items: Optional[int] = None, bytes: Optional[int] = None, **attrs):
+        """Fill in counts that are only known once the work is done."""
+        if items is not None:
+            self.items = items
+        if bytes is not None:
+            self.bytes = bytes
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if _otel_tracer is not None:
+            self._otel = _otel_tracer.start_span(self.name)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        _record(self, duration, error=exc_type is not None)
+        if self._otel is not None:
+            for k, v in self._attributes().items():
+                self._otel.set_attribute(k, v)
+            self._otel.end()
+        return False
+
+    def _attributes(self) -> Dict[str, Any]:
+        out = {k: v for k, v in self.attrs.items() if isinstance(v, (str, int, float, bool))}
+        if self.items is not None:
+            out["items"] = int(self.items)
+        if self.bytes is not None:
+            out["bytes"] = int(self.bytes)
+        return out
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = bool(on)
+
+def span(name: str, items: Optional[int] = None, bytes: Optional[int] = None, **attrs):
+    if not _enabled:
+        return _NOOP
+    return Span(name, items, bytes, attrs)
+
+def timed_iter(name: str, iterator: Iterator, **attrs) -> Iterator:
+    """Span over consuming an iterator (e.g. a token stream); records time to first item too."""
+    if not _enabled:
+        yield from iterator
+        return
+    t0 = time.perf_counter()
+    first = None
+    n = 0
+    with span(name, **attrs) as s:
+        for item in iterator:
+            if first is None:
+                first = time.perf_counter() - t0
+            n += 1
+            yield item
+        s.set(items=n, first_item_seconds=round(first or 0.0, 6))
+
+def incr(name: str, value: float = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    if _otel_meter is not None:
+        counter = _otel_counters.get(name)
+        if counter is None:
+            counter = _otel_counters.setdefault(name, _otel_meter.create_counter(name))
+        counter.add(value)
+
+def _record(s: Span, duration: float, error: bool = False):
+    with _lock:
+        st = _stages.get(s.name)
+        if st is None:
+            st = _stages[s.name] = {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0, "items": 0, "bytes": 0}
+        st["count"] += 1
+        st["errors"] += int(error)
+        st["total_s"] += duration
+        st["max_s"] = max(st["max_s"], duration)
+        st["items"] += int(s.items or 0)
+        st["bytes"] += int(s.bytes or 0)
+        _recent.append({
+            "name": s.name, "ts": time.time(), "seconds": round(duration, 6),
+            "items": s.items, "bytes": s.bytes, "error": error, **s._attributes(),
+        })
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        stages = {}
+        for name, st in _stages.items():
+            stages[name] = dict(st, mean_s=st["total_s"] / st["count"] if st["count"] else 0.0)
+        return {"enabled": _enabled, "stages": stages, "counters": dict(_counters), "recent": list(_recent)}
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _recent.clear()
+
+def _metric_name(name: str) -> str:
+    return "cv_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+def prometheus_text() -> str:
+    snap = snapshot()
+    lines: List[str] = []
+    for field, kind in (("count", "counter"), ("errors", "counter"), ("total_s", "counter"),
+                        ("items", "counter"), ("bytes", "counter"), ("max_s", "gauge")):
+        metric = _metric_name(f"stage_{field}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage, st in sorted(snap["stages"].items()):
+            lines.append(f'{metric}{{stage="{stage}"}} {st[field]}')
+    for name, value in sorted(snap["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+_prom_server: Optional[ThreadingHTTPServer] = None
+
+def start_prometheus_server(port: int = METRICS_PROMETHEUS_PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve prometheus_text() on http://host:port/ from a daemon thread (once per process)."""
+    global _prom_server
+    with _lock:
+        if _prom_server is None:
+            _prom_server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+            _prom_server.daemon_threads = True
+            threading.Thread(target=_prom_server.serve_forever, daemon=True).start()
+        return _prom_server
+
+def enable_otel(service_name: str = "cv-offline") -> bool:
+    """Mirror spans/counters to the globally configured OpenTelemetry providers, if installed."""
+    global _otel_tracer, _otel_meter
+    try:
+        from opentelemetry import metrics as otel_metrics, trace
+    except ImportError:
+        return False
+    _otel_tracer = trace.get_tracer(service_name)
+    _otel_meter = otel_metrics.get_meter(service_name)
+    return True
+
+if METRICS_OTEL:
+    enable_otel()
+if METRICS_PROMETHEUS_PORT and METRICS_ENABLED:
+    start_prometheus_server()
@@ -0,0 +1,20 @@
+import re
+from typing import List
+
+from backend.config import PASSAGE_WORDS
+
+_WORD = re.compile(r"\S+")
+
+def split_passages(text: str, size: int = PASSAGE_WORDS, overlap: int = 0) -> List[str]:
+    """Word windows of `size` words, each starting `size - overlap` words after the previous one."""
+    words = _WORD.findall(text or "")
+    if not words:
+        return []
+    size = max(1, int(size))
+    step = max(1, size - max(0, int(overlap)))
+    out = []
+    for start in range(0, len(words), step):
+        out.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return out
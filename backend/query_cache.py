@@ -0,0 +1,190 @@
+import atexit
+import copy
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.config import QUERY_CACHE_MAX_ITEMS, QUERY_CACHE_TTL_SEC, QUERY_CACHE_PATH, QUERY_CACHE_FLUSH_SEC
+from backend.embeddings import to_dense
+from backend import metrics
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire ttl seconds after being stored (ttl <= 0: never)."""
+
+    def __init__(self, max_items: int = QUERY_CACHE_MAX_ITEMS, ttl: float = QUERY_CACHE_TTL_SEC):
+        self.max_items = max(1, int(max_items))
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (self.ttl > 0 and time.time() - item[0] > self.ttl):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def dump(self) -> List[tuple]:
+        with self._lock:
+            return list(self._data.items())
+
+    def restore(self, items: List[tuple]):
+        with self._lock:
+            for key, entry in items[-self.max_items:]:
+                self._data[key] = entry
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "items": len(self._data)}
+
+def vector_digest(vec) -> str:
+    arr = np.ascontiguousarray(to_dense(vec), dtype=np.float32)
+    return hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+
+class QueryCache:
+    """Three layers for the search tab, all bounded by max_items and ttl.
+
+    - embeddings: (model_id, query text) -> query vector
+    - hits: (search key, filter, top_k) -> hit list
+    - answers: (query, hit IDs) -> generated answer
+
+    Hit and answer keys start with the index signature, so one instance can
+    be shared by sessions searching different files or backends: use
+    for_signature() to get a view bound to a signature (entries of other
+    signatures simply age out). With persist=True the layers are pickled to
+    path by a background flush at most every flush_sec seconds after writes.
+    """
+
+    def __init__(self, max_items: int = QUERY_CACHE_MAX_ITEMS, ttl: float = QUERY_CACHE_TTL_SEC,
+                 persist: bool = False, path: str = QUERY_CACHE_PATH, flush_sec: float = QUERY_CACHE_FLUSH_SEC):
+        self.embeddings = TTLCache(max_items, ttl)
+        self.hits = TTLCache(max_items, ttl)
+        self.answers = TTLCache(max_items, ttl)
+        self.signature: Optional[str] = None
+        self.persist = persist
+        self.path = path
+        self.flush_sec = max(0.0, float(flush_sec))
+        # Shared (by reference) with every for_signature() view.
+        self._io = {"lock": threading.Lock(), "timer": None}
+        if persist:
+            self._load()
+            atexit.register(self.flush)
+
+    def for_signature(self, signature: str) -> "QueryCache":
+        """View sharing this cache's layers whose hit/answer keys use signature."""
+        view = copy.copy(self)
+        view.signature = signature
+        return view
+
+    def set_signature(self, signature: str):
+        """Bind this instance to signature; only for caches owned by a single index."""
+        self.signature = signature
+
+    def _get_or_compute(self, layer: TTLCache, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = layer.get(key, _MISSING)
+        metrics.incr("query_cache.misses" if value is _MISSING else "query_cache.hits")
+        if value is _MISSING:
+            value = compute()
+            layer.put(key, value)
+            self._save()
+        return value
+
+    def embedding(self, model_id: str, text: str, compute: Callable[[], Any]):
+        return self._get_or_compute(self.embeddings, (model_id, text), compute)
+
+    def search_key(self, key: Sequence, where: Optional[Dict], top_k: int) -> tuple:
+        return (self.signature, tuple(key), json.dumps(where, sort_keys=True, default=str), int(top_k))
+
+    def search(self, key: Sequence, where: Optional[Dict], top_k: int, compute: Callable[[], List[Dict]]):
+        return self._get_or_compute(self.hits, self.search_key(key, where, top_k), compute)
+
+    def _answer_key(self, query: str, hits: List[Dict]) -> tuple:
+        return (self.signature, query, tuple((str(h.get("id")), "summary" in h) for h in hits))
+
+    def answer(self, query: str, hits: List[Dict], compute: Callable[[], str]) -> str:
+        return self._get_or_compute(self.answers, self._answer_key(query, hits), compute)
+
+    def lookup_answer(self, query: str, hits: List[Dict]) -> Optional[str]:
+        """Cached answer or None; for streamed answers that are stored once complete."""
+        value = self.answers.get(self._answer_key(query, hits))
+        metrics.incr("query_cache.misses" if value is None else "query_cache.hits")
+        return value
+
+    def store_answer(self, query: str, hits: List[Dict], answer: str):
+        self.answers.put(self._answer_key(query, hits), answer)
+        self._save()
+
+    def clear(self):
+        for layer in (self.embeddings, self.hits, self.answers):
+            layer.clear()
+        self.flush()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"embeddings": self.embeddings.stats(), "hits": self.hits.stats(), "answers": self.answers.stats()}
+
+    def _save(self):
+        """Schedule a flush; writes within flush_sec are coalesced into one pickle."""
+        if not self.persist:
+            return
+        if not self.flush_sec:
+            self.flush()
+            return
+        with self._io["lock"]:
+            if self._io["timer"] is not None:
+                return
+            timer = threading.Timer(self.flush_sec, self.flush)
+            timer.daemon = True
+            self._io["timer"] = timer
+        timer.start()
+
+    def flush(self):
+        if not self.persist:
+            return
+        with self._io["lock"]:
+            self._io["timer"] = None
+            state = {"layers": {name: getattr(self, name).dump() for name in ("embeddings", "hits", "answers")}}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        for name, items in state.get("layers", {}).items():
+            layer = getattr(self, name, None)
+            if isinstance(layer, TTLCache):
+                layer.restore(items)
@@ -0,0 +1,138 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from backend.config import SNAPSHOT_DIR, OFFLINE_LSA_DIM, OFFLINE_REFIT_OVERLAP
+from backend.embedding_cache import EmbeddingCache, text_key
+from backend.embeddings import OfflineEmbedder, EngineEmbedder
+
+# A snapshot is a directory holding meta.json, the fitted vectorizer (offline
+# only) and the vectors as plain .npy files so they can be memory-mapped.
+SNAPSHOT_VERSION = 1
+CSR_PARTS = ("data", "indices", "indptr")
+
+def _digest(obj) -> str:
+    return hashlib.blake2b(repr(obj).encode(), digest_size=8).hexdigest()
+
+def file_signature(path: str, records_len: int, kind: str, model: str) -> tuple:
+    try:
+        mtime = os.path.getmtime(path)
+        size = os.path.getsize(path)
+    except OSError:
+        mtime, size = 0.0, 0
+    return (os.path.abspath(path), round(mtime, 3), size, int(records_len), kind, model)
+
+def snapshot_dir(sig: tuple, root: str = SNAPSHOT_DIR) -> str:
+    """sig is a file_signature: (path, mtime, size, n_records, kind, model)."""
+    path, kind, model = sig[0], sig[-2], sig[-1]
+    return os.path.join(root, f"{_digest((path, kind, model))}-{_digest(sig)}")
+
+def save_snapshot(sig: tuple, kind: str, embedder, vectors, root: str = SNAPSHOT_DIR) -> str:
+    target = snapshot_dir(sig, root)
+    tmp = f"{target}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "signature": list(sig),
+        "kind": kind,
+        "model": getattr(embedder, "model", None),
+        "shape": list(vectors.shape),
+        "sparse": bool(issparse(vectors)),
+    }
+    if kind == "offline":
+        embedder.save(os.path.join(tmp, "embedder.joblib"))
+    if issparse(vectors):
+        m = csr_matrix(vectors)
+        for part in CSR_PARTS:
+            np.save(os.path.join(tmp, f"{part}.npy"), getattr(m, part))
+    else:
+        np.save(os.path.join(tmp, "vectors.npy"), np.ascontiguousarray(vectors))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    # Older snapshots of the same source/kind/model can never match again.
+    prefix = os.path.basename(target).split("-")[0]
+    for stale in glob.glob(os.path.join(root, f"{prefix}-*")):
+        if stale != target:
+            shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+def load_snapshot(sig: tuple, root: str = SNAPSHOT_DIR) -> Optional[Tuple[object, object]]:
+    """(embedder, vectors) for sig, with vectors memory-mapped read-only; None on a miss."""
+    target = snapshot_dir(sig, root)
+    meta_path = os.path.join(target, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION or tuple(meta["signature"]) != tuple(sig):
+            return None
+
+        if meta["sparse"]:
+            data, indices, indptr = (
+                np.load(os.path.join(target, f"{part}.npy"), mmap_mode="r") for part in CSR_PARTS
+            )
+            vectors = csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+        else:
+            vectors = np.load(os.path.join(target, "vectors.npy"), mmap_mode="r")
+
+        if meta["kind"] == "offline":
+            embedder = OfflineEmbedder.load(os.path.join(target, "embedder.joblib"))
+            embedder.matrix = vectors
+        else:
+            embedder = EngineEmbedder(model=meta["model"])
+    except Exception:
+        return None
+    return embedder, vectors
+
+def _vocabulary_paths(source: str, lsa_dim: int, root: str) -> Tuple[str, str]:
+    base = os.path.join(root, "vocabularies", _digest((os.path.abspath(source), int(lsa_dim))))
+    return f"{base}.joblib", f"{base}.keys.npy"
+
+def offline_embedder_for(source: str, texts: List[str], lsa_dim: int = OFFLINE_LSA_DIM,
+                         cache: Optional[EmbeddingCache] = None, refit: bool = False,
+                         min_overlap: float = OFFLINE_REFIT_OVERLAP, root: str = SNAPSHOT_DIR):
+    """(OfflineEmbedder, vectors of texts) with the vocabulary kept across versions of source.
+
+    Refitting on every new file version would change model_id each time, so
+    the embedding cache would never hit and sync_records would re-upsert
+    every row. The fitted embedder is stored per source path (as
+    backend.ingest does) and reused while at least min_overlap of texts were
+    in the corpus it was fitted on; below that, or with refit, it is refit.
+    """
+    model_path, keys_path = _vocabulary_paths(source, lsa_dim, root)
+    keys = [text_key(t) for t in texts]
+    if not refit and os.path.exists(model_path) and os.path.exists(keys_path):
+        try:
+            fitted_on = set(np.load(keys_path).astype(str).tolist())
+            overlap = sum(1 for k in keys if k in fitted_on) / max(1, len(keys))
+            if overlap >= min_overlap:
+                embedder = OfflineEmbedder.load(model_path)
+                embedder.cache = cache
+                vectors = embedder.embed_batch(texts)
+                embedder.matrix = vectors
+                return embedder, vectors
+        except Exception:
+            pass
+
+    embedder = OfflineEmbedder(sparse=True, cache=cache, lsa_dim=lsa_dim)
+    vectors = embedder.fit_transform(texts)
+    try:
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        embedder.save(model_path)
+        np.save(keys_path, np.array(sorted(set(keys)), dtype="S32"))
+    except OSError:
+        pass
+    return embedder, vectors
@@ -0,0 +1,212 @@
+"""Precomputed 5-sentence resume summaries.
+
+    python -m backend.summaries --source data/uploads/csv/Resume.csv --workers 8 --rate 4
+
+Summaries are stored in SQLite keyed by a hash of (model, prompt, resume
+text), so reruns only summarize new or changed resumes. Requests go through
+the shared EngineClient (keep-alive, retries with backoff) with at most
+`workers` in flight and at most `rate` started per second.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from backend.config import (
+    CSV_PATH,
+    GENERATIVE_ENGINE_MODEL,
+    SUMMARY_STORE_PATH,
+    SUMMARY_WORKERS,
+    SUMMARY_RATE_PER_SEC,
+    SUMMARY_MAX_TOKENS,
+    SUMMARY_INPUT_TOKENS,
+)
+from backend.engine_client import EngineClient
+from backend import metrics
+from backend.tokens import truncate_tokens
+
+SUMMARY_PROMPT = (
+    "Summarize this candidate's resume in 5 sentences, focusing on their experience, main skills, "
+    "and professional highlights. Be concise and informative.\n\n"
+    "RESUME:\n{text}\n"
+)
+SQLITE_MAX_VARS = 900
+
+ProgressCb = Optional[Callable[[int, int, str], None]]
+
+def summary_key(text: str, model: str = GENERATIVE_ENGINE_MODEL) -> str:
+    """Changes whenever the resume text, the model or the prompt would."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model, SUMMARY_PROMPT, text):
+        h.update(part.encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class SummaryStore:
+    def __init__(self, path: str = SUMMARY_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, summary TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        keys = list(dict.fromkeys(keys))
+        out: Dict[str, str] = {}
+        with self._connect() as con:
+            for start in range(0, len(keys), SQLITE_MAX_VARS):
+                chunk = keys[start:start + SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(chunk))
+                for key, summary in con.execute(f"SELECT key, summary FROM summaries WHERE key IN ({marks})", chunk):
+                    out[key] = summary
+        return out
+
+    def put(self, key: str, model: str, summary: str):
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, summary, created) VALUES (?, ?, ?, ?)",
+                (key, model, summary, time.time()),
+            )
+
+    def count(self) -> int:
+        with self._connect() as con:
+            return int(con.execute("SELECT COUNT(*) FROM summaries").fetchone()[0])
+
+class RateLimiter:
+    """Spaces acquire() calls at least 1/rate seconds apart across threads (rate <= 0: no limit)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def summarize_text(text: str, client: Optional[EngineClient] = None,
+                   model: str = GENERATIVE_ENGINE_MODEL) -> str:
+    client = client or EngineClient()
+    prompt = SUMMARY_PROMPT.format(text=truncate_tokens(text, SUMMARY_INPUT_TOKENS))
+    return client.chat(model, [{"role": "user", "content": prompt}],
+                       temperature=0.3, max_tokens=SUMMARY_MAX_TOKENS).strip()
+
+def summarize_records(
+    records: List[Dict],
+    store: Optional[SummaryStore] = None,
+    client: Optional[EngineClient] = None,
+    model: str = GENERATIVE_ENGINE_MODEL,
+    workers: int = SUMMARY_WORKERS,
+    rate: float = SUMMARY_RATE_PER_SEC,
+    update: ProgressCb = None,
+) -> Dict[str, int]:
+    """Summarize every record whose text has no stored summary yet.
+
+    Each summary is written as soon as it arrives, so an interrupted run keeps
+    its progress. Failures (after the client's retries) are counted and left
+    for the next run.
+    """
+    store = store or SummaryStore()
+    client = client or EngineClient()
+    limiter = RateLimiter(rate)
+
+    todo: Dict[str, str] = {}
+    keys = [summary_key(r["Resume_str"], model) for r in records]
+    known = store.get_many(keys)
+    for k, r in zip(keys, records):
+        if k not in known and k not in todo:
+            todo[k] = r["Resume_str"]
+
+    stats = {"total": len(records), "cached": len(set(keys)) - len(todo), "summarized": 0, "failed": 0}
+    if not todo:
+        return stats
+
+    def _one(key: str, text: str):
+        limiter.acquire()
+        summary = summarize_text(text, client=client, model=model)
+        store.put(key, model, summary)
+
+    done = 0
+    with metrics.span("summarize", items=len(todo)):
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            futures = [pool.submit(_one, k, t) for k, t in todo.items()]
+            try:
+                # Progress is reported from this thread so UI callbacks stay single-threaded.
+                for fut in as_completed(futures):
+                    if fut.exception() is None:
+                        stats["summarized"] += 1
+                    else:
+                        stats["failed"] += 1
+                    done += 1
+                    if update:
+                        update(done, len(todo), "Summarizing")
+            except BaseException:
+                for fut in futures:
+                    fut.cancel()
+                raise
+    return stats
+
+def attach_summaries(hits: List[Dict], store: SummaryStore, text_of: Callable[[str], Optional[str]] = None,
+                     model: str = GENERATIVE_ENGINE_MODEL) -> List[Dict]:
+    """Copies of hits with a "summary" field wherever a stored summary exists.
+
+    text_of maps a hit ID to the full resume text; hits whose document is only
+    a passage need it to find their summary.
+    """
+    texts = []
+    for h in hits:
+        text = text_of(str(h.get("id"))) if text_of else None
+        texts.append(text if text is not None else (h.get("document") or ""))
+    keys = [summary_key(t, model) for t in texts]
+    found = store.get_many(keys)
+    out = []
+    for h, k in zip(hits, keys):
+        h = dict(h)
+        if k in found:
+            h["summary"] = found[k]
+        out.append(h)
+    return out
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from backend.dataset import load_dataset
+
+    ap = argparse.ArgumentParser(prog="python -m backend.summaries", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--source", default=CSV_PATH)
+    ap.add_argument("--model", default=GENERATIVE_ENGINE_MODEL)
+    ap.add_argument("--workers", type=int, default=SUMMARY_WORKERS)
+    ap.add_argument("--rate", type=float, default=SUMMARY_RATE_PER_SEC, help="max requests started per second")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    records = load_dataset(args.source).records
+    if not records:
+        print(f"No usable resumes in {args.source}", file=sys.stderr)
+        return 1
+
+    def progress(i: int, total: int, _: str):
+        if not args.quiet and (i == total or i % 50 == 0):
+            print(f"[summaries] {i:,}/{total:,}", file=sys.stderr, flush=True)
+
+    stats = summarize_records(records, model=args.model, workers=args.workers, rate=args.rate, update=progress)
+    print(json.dumps(stats))
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
-from typing import List, Dict
-from backend.config import CHAT_MODEL
+from typing import List, Dict, Iterator, Optional, Union
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from backend.config import CHAT_MODEL, CONTEXT_TOKEN_BUDGET, PASSAGE_WORDS
 from backend.engine_client import EngineClient
+from backend import metrics
+from backend.passages import split_passages
+from backend.tokens import count_tokens
 
 SYSTEM_PROMPT = (
     "You are an assistant that answers hiring queries using only the provided resume snippets. "
@@ -22,10 +28,84 @@ def build_context_snippets(hits: List[Dict], max_chars: int = 8000) -> str:
         length += len(snippet)
     return "".join(parts)
 
-def answer_query(query: str, hits: List[Dict]) -> str:
-    client = EngineClient()
-    context = build_context_snippets(hits)
-    messages = [
+def _hit_header(h: Dict) -> str:
+    cat = (h.get("metadata") or {}).get("Category", "")
+    return f"[ID: {h.get('id')} | Category: {cat}]"
+
+def _passage_scores(query: str, passages: List[str], vectorizer=None) -> np.ndarray:
+    try:
+        if vectorizer is None:
+            vectorizer = TfidfVectorizer(sublinear_tf=True).fit(passages + [query])
+        mat = vectorizer.transform(passages)
+        q = vectorizer.transform([query])
+    except ValueError:
+        return np.zeros(len(passages))
+    return np.asarray((mat @ q.T).todense()).ravel()
+
+def build_context(
+    query: str,
+    hits: List[Dict],
+    max_tokens: int = CONTEXT_TOKEN_BUDGET,
+    vectorizer=None,
+    passage_words: int = PASSAGE_WORDS,
+) -> str:
+    """Pack the passages most relevant to query from all hits into a token budget.
+
+    Each hit is split into passages scored by TF-IDF cosine with the query
+    (vectorizer may be an already fitted TfidfVectorizer). Every candidate
+    first gets its best passage, in rank order, then the remaining budget goes
+    to the best passages overall. Output keeps rank order and passage order.
+    A hit's stored "summary" (backend.summaries) is used in place of its document.
+    """
+    items = []
+    for rank, h in enumerate(hits):
+        # A stored summary (backend.summaries) stands in for the full resume text.
+        for pos, text in enumerate(split_passages(h.get("summary") or h.get("document") or "", passage_words)):
+            items.append((rank, pos, text))
+    if not items:
+        return ""
+
+    scores = _passage_scores(query, [t for _, _, t in items], vectorizer)
+    costs = [count_tokens(t) + 2 for _, _, t in items]
+    header_costs = [count_tokens(_hit_header(h)) + 3 for h in hits]
+
+    chosen = set()
+    used = 0
+    opened = set()
+
+    def _take(i: int) -> bool:
+        nonlocal used
+        rank = items[i][0]
+        cost = costs[i] + (0 if rank in opened else header_costs[rank])
+        if used + cost > max_tokens:
+            return False
+        used += cost
+        opened.add(rank)
+        chosen.add(i)
+        return True
+
+    # Higher score first; earlier rank breaks ties.
+    order = sorted(range(len(items)), key=lambda i: (-scores[i], items[i][0], items[i][1]))
+    best_per_hit = {}
+    for i in order:
+        best_per_hit.setdefault(items[i][0], i)
+    for rank in sorted(best_per_hit):
+        _take(best_per_hit[rank])
+    for i in order:
+        if i not in chosen:
+            _take(i)
+
+    parts = []
+    for rank, h in enumerate(hits):
+        picked = sorted(items[i][1:] for i in chosen if items[i][0] == rank)
+        if picked:
+            body = " … ".join(text for _, text in picked)
+            parts.append(f"{_hit_header(h)}\n{body}\n---\n")
+    return "".join(parts)
+
+def _answer_messages(query: str, hits: List[Dict], vectorizer=None) -> List[Dict[str, str]]:
+    context = build_context(query, hits, vectorizer=vectorizer)
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {
             "role": "user",
@@ -36,4 +116,13 @@ def answer_query(query: str, hits: List[Dict]) -> str:
             ),
         },
     ]
-    return client.chat(CHAT_MODEL, messages, temperature=0.2)
\ No newline at end of file
+
+def answer_query(query: str, hits: List[Dict], stream: bool = False,
+                 vectorizer=None, client: Optional[EngineClient] = None) -> Union[str, Iterator[str]]:
+    """Answer text, or with stream=True an iterator of text pieces as the engine generates them."""
+    client = client or EngineClient()
+    messages = _answer_messages(query, hits, vectorizer=vectorizer)
+    if stream:
+        return metrics.timed_iter("answer", client.chat_stream(CHAT_MODEL, messages, temperature=0.2), streamed=True)
+    with metrics.span("answer", items=1, streamed=False):
+        return client.chat(CHAT_MODEL, messages, temperature=0.2)
\ No newline at end of file
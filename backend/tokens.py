@@ -0,0 +1,71 @@
+import re
+import threading
+from typing import List
+from backend.config import TOKEN_ENCODING
+
+# tiktoken is optional, and it downloads its BPE file on first use, which
+# fails on offline boxes; both cases fall back to a word-piece estimate.
+_PIECE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+def _get_encoder():
+    global _encoder, _encoder_loaded
+    with _encoder_lock:
+        if not _encoder_loaded:
+            try:
+                import tiktoken
+                _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception:
+                _encoder = None
+            _encoder_loaded = True
+        return _encoder
+
+def estimate_tokens(text: str) -> int:
+    """BPE-like estimate: roughly one token per 5 characters of a word, one per punctuation mark."""
+    return sum(_piece_cost(p) for p in _PIECE.findall(text or ""))
+
+def _piece_cost(piece: str) -> int:
+    return max(1, (len(piece) + 2) // 5)
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoder()
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text or "", disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text that fits in max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    enc = _get_encoder()
+    if enc is not None:
+        return enc.decode(enc.encode(text, disallowed_special=())[:max(0, max_tokens)])
+    used, end = 0, 0
+    for m in _PIECE.finditer(text):
+        cost = _piece_cost(m.group())
+        if used + cost > max_tokens:
+            break
+        used += cost
+        end = m.end()
+    return text[:end]
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Consecutive pieces of text, each fitting in max_tokens (text itself when it already fits)."""
+    max_tokens = max(1, int(max_tokens))
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    enc = _get_encoder()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return [enc.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    pieces, used, start = [], 0, 0
+    for m in _PIECE.finditer(text):
+        cost = _piece_cost(m.group())
+        if used and used + cost > max_tokens:
+            pieces.append(text[start:m.start()])
+            used, start = 0, m.start()
+        used += cost
+    pieces.append(text[start:])
+    return pieces
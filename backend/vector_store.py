@@ -1,84 +1,475 @@
+import abc
+import hashlib
 import numpy as np
 import os
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
 
+from backend.config import CHUNK_WORDS, CHUNK_OVERLAP
+from backend.embeddings import to_dense
+from backend.file_processor import id_key
+from backend.passages import split_passages
+from backend import metrics
+
 DEFAULT_DIR = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
     "data", "chromadb"
 )
 COLLECTION = "cv_embeddings"
+PASSAGE_COLLECTION = "cv_passages"
+AGGREGATIONS = ("max", "sum")
+
+# Process-wide handles: one client per persist dir, one collection handle per client.
+_handles_lock = threading.RLock()
+_clients: Dict[str, object] = {}
+_collections: Dict[Tuple[int, str], Tuple[object, object]] = {}
 
 def get_client(persist_dir: Optional[str] = None):
-    persist_dir = persist_dir or DEFAULT_DIR
-    os.makedirs(persist_dir, exist_ok=True)
-    client = chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
-    return client
-
-def get_collection(client):
-    try:
-        col = client.get_collection(COLLECTION)
-    except Exception:
-        col = client.create_collection(COLLECTION)
-    return col
-
-def reset_collection(client):
-    try:
-        client.delete_collection(COLLECTION)
-    except Exception:
-        pass
-    return client.create_collection(COLLECTION)
+    persist_dir = os.path.abspath(persist_dir or DEFAULT_DIR)
+    with _handles_lock:
+        client = _clients.get(persist_dir)
+        if client is None:
+            os.makedirs(persist_dir, exist_ok=True)
+            client = chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
+            _clients[persist_dir] = client
+        return client
+
+def get_collection(client, name: str = COLLECTION):
+    with _handles_lock:
+        cached = _collections.get((id(client), name))
+        if cached is not None and cached[0] is client:
+            return cached[1]
+        try:
+            col = client.get_collection(name)
+        except Exception:
+            col = client.create_collection(name)
+        _collections[(id(client), name)] = (client, col)
+        return col
+
+def reset_collection(client, name: str = COLLECTION):
+    with _handles_lock:
+        _collections.pop((id(client), name), None)
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass
+        col = client.create_collection(name)
+        _collections[(id(client), name)] = (client, col)
+        return col
+
+def clear_handles():
+    """Drop cached clients/collections, e.g. after the persist dir was removed on disk."""
+    with _handles_lock:
+        _clients.clear()
+        _collections.clear()
+
+def content_hash(record: Dict, embedding_tag: str = "") -> str:
+    """Changes whenever the stored document, metadata or embedding model would."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (embedding_tag, record.get("Category", ""), record["Resume_str"]):
+        h.update(str(part).encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _metadata(record: Dict, embedding_tag: str) -> Dict:
+    meta = {"Category": record.get("Category", ""), "content_hash": content_hash(record, embedding_tag)}
+    if "parent_id" in record:
+        meta["parent_id"] = str(record["parent_id"])
+    return meta
+
+def chunk_records(records: List[Dict], size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Dict]:
+    """Overlapping passages of each resume as records with ID "<parent>#<n>" and a parent_id link."""
+    out = []
+    for r in records:
+        for n, text in enumerate(split_passages(r["Resume_str"], size, overlap)):
+            out.append({
+                "ID": f"{id_key(r['ID'])}#{n}",
+                "Resume_str": text,
+                "Category": r.get("Category", ""),
+                "parent_id": id_key(r["ID"]),
+            })
+    return out
 
 def index_records(
     records: List[Dict],
     embeddings,
     client=None,
-    batch: int = 1000
+    batch: int = 1000,
+    embedding_tag: str = "",
 ):
     client = client or get_client()
     col = get_collection(client)
     N = len(records)
-    for start in range(0, N, batch):
-        end = min(start + batch, N)
-        chunk = records[start:end]
-        emb = embeddings[start:end]
-        ids = [str(r["ID"]) for r in chunk]
-        docs = [r["Resume_str"] for r in chunk]
-        metas = [{"Category": r.get("Category", "")} for r in chunk]
-        col.add(ids=ids, documents=docs, metadatas=metas, embeddings=emb.tolist())
+    with metrics.span("index", items=N, collection=COLLECTION):
+        for start in range(0, N, batch):
+            end = min(start + batch, N)
+            chunk = records[start:end]
+            emb = to_dense(embeddings[start:end])
+            ids = [id_key(r["ID"]) for r in chunk]
+            docs = [r["Resume_str"] for r in chunk]
+            metas = [_metadata(r, embedding_tag) for r in chunk]
+            col.add(ids=ids, documents=docs, metadatas=metas, embeddings=emb.tolist())
     return col.count()
 
-def query(
-    query_text: str,
-    query_embedding,
+def _stored_hashes(col, batch: int) -> Dict[str, Optional[str]]:
+    stored: Dict[str, Optional[str]] = {}
+    offset = 0
+    while True:
+        page = col.get(include=["metadatas"], limit=batch, offset=offset)
+        ids = page["ids"]
+        for cid, meta in zip(ids, page["metadatas"]):
+            stored[cid] = (meta or {}).get("content_hash")
+        if len(ids) < batch:
+            return stored
+        offset += len(ids)
+
+def stored_hashes_for(col, ids: List[str]) -> Dict[str, Optional[str]]:
+    """content_hash of each of ids already in col (absent IDs are left out)."""
+    if not ids:
+        return {}
+    page = col.get(ids=list(ids), include=["metadatas"])
+    return {cid: (meta or {}).get("content_hash") for cid, meta in zip(page["ids"], page["metadatas"])}
+
+def upsert_records(col, records: List[Dict], embeddings, embedding_tag: str = ""):
+    if not records:
+        return
+    col.upsert(
+        ids=[id_key(r["ID"]) for r in records],
+        documents=[r["Resume_str"] for r in records],
+        metadatas=[_metadata(r, embedding_tag) for r in records],
+        embeddings=to_dense(embeddings).tolist(),
+    )
+
+def _stored_dimension(col) -> Optional[int]:
+    page = col.get(limit=1, include=["embeddings"])
+    embs = page.get("embeddings")
+    if embs is None or len(embs) == 0:
+        return None
+    return len(embs[0])
+
+def sync_records(
+    records: List[Dict],
+    embeddings,
+    client=None,
+    batch: int = 1000,
+    embedding_tag: str = "",
+    collection: str = COLLECTION,
+) -> Dict[str, int]:
+    """Bring the collection in line with records: upsert new/changed IDs, delete missing ones.
+
+    Records whose ID and content_hash already match are not rewritten, so the
+    cost follows the size of the delta rather than the corpus.
+    """
+    client = client or get_client()
+    col = get_collection(client, collection)
+
+    if len(records) and _stored_dimension(col) not in (None, embeddings.shape[1]):
+        col = reset_collection(client, collection)
+    stored = _stored_hashes(col, batch)
+
+    # Later duplicates of an ID win, matching upsert semantics.
+    latest: Dict[str, int] = {}
+    hashes: List[str] = []
+    for i, r in enumerate(records):
+        latest[id_key(r["ID"])] = i
+        hashes.append(content_hash(r, embedding_tag))
+
+    changed = [i for cid, i in latest.items() if stored.get(cid) != hashes[i]]
+    removed = [cid for cid in stored if cid not in latest]
+
+    with metrics.span("index", items=len(changed) + len(removed), collection=collection):
+        for start in range(0, len(changed), batch):
+            idx = changed[start:start + batch]
+            upsert_records(col, [records[i] for i in idx], embeddings[idx], embedding_tag)
+        for start in range(0, len(removed), batch):
+            col.delete(ids=removed[start:start + batch])
+
+    added = sum(1 for i in changed if id_key(records[i]["ID"]) not in stored)
+    return {
+        "added": added,
+        "updated": len(changed) - added,
+        "deleted": len(removed),
+        "unchanged": len(latest) - len(changed),
+        "total": col.count(),
+    }
+
+def _hits(res: Dict, n: int) -> List[Dict]:
+    distances = res.get("distances") or [[None] * len(ids) for ids in res["ids"]]
+    hits = []
+    for i in range(len(res["ids"][n])):
+        hits.append({
+            "id": res["ids"][n][i],
+            "document": res["documents"][n][i],
+            "metadata": res["metadatas"][n][i],
+            "distance": distances[n][i],
+        })
+    return hits
+
+def query_many(
+    query_embeddings,
     top_k: int = 10,
     where: Optional[Dict] = None,
-    client=None
-):
+    client=None,
+    collection: str = COLLECTION,
+) -> List[List[Dict]]:
+    """Hits for every row of query_embeddings in a single collection round trip."""
     client = client or get_client()
-    col = get_collection(client)
+    col = get_collection(client, collection)
 
+    mat = np.atleast_2d(to_dense(query_embeddings))
+    if mat.shape[0] == 0:
+        return []
     kwargs = dict(
-        query_embeddings=[query_embedding.tolist()],
+        query_embeddings=mat.tolist(),
         n_results=top_k,
     )
     if where:
         kwargs["where"] = where
 
-    res = col.query(**kwargs)
+    with metrics.span("query", items=mat.shape[0], backend="chroma", collection=collection):
+        res = col.query(**kwargs)
+    return [_hits(res, n) for n in range(len(res["ids"]))]
+
+def query(
+    query_text: str,
+    query_embedding,
+    top_k: int = 10,
+    where: Optional[Dict] = None,
+    client=None
+):
+    return query_many(to_dense(query_embedding).reshape(1, -1), top_k=top_k, where=where, client=client)[0]
+
+def _aggregate(passage_hits: List[Dict], top_k: int, agg: str) -> List[Dict]:
+    groups: Dict[str, List[Dict]] = {}
+    for h in passage_hits:
+        parent = (h.get("metadata") or {}).get("parent_id") or h["id"].split("#")[0]
+        groups.setdefault(parent, []).append(h)
+
+    def _sim(h: Dict) -> float:
+        # Squared L2 between unit vectors: d = 2 - 2 cos.
+        return 1.0 - (h.get("distance") or 0.0) / 2.0
+
+    scored = []
+    for parent, hs in groups.items():
+        sims = [_sim(h) for h in hs]
+        scored.append((max(sims) if agg == "max" else sum(sims), parent, hs))
+    scored.sort(key=lambda x: -x[0])
 
     hits = []
-    for i in range(len(res["ids"][0])):
+    for score, parent, hs in scored[:top_k]:
+        ordered = sorted(hs, key=lambda h: int(h["id"].rsplit("#", 1)[-1]) if "#" in h["id"] else 0)
+        meta = {k: v for k, v in (hs[0].get("metadata") or {}).items() if k not in ("parent_id", "content_hash")}
         hits.append({
-            "id": res["ids"][0][i],
-            "document": res["documents"][0][i],
-            "metadata": res["metadatas"][0][i],
-            "distance": res.get("distances", [[None]])[0][i],
+            "id": parent,
+            "document": " … ".join(h.get("document") or "" for h in ordered),
+            "metadata": meta,
+            "distance": min(h.get("distance") or 0.0 for h in hs),
         })
     return hits
 
-def count(client=None):
+def query_many_chunked(
+    query_embeddings,
+    top_k: int = 10,
+    where: Optional[Dict] = None,
+    client=None,
+    agg: str = "max",
+    fanout: int = 5,
+) -> List[List[Dict]]:
+    """Search the passage collection and roll passage hits up to ranked candidates.
+
+    agg="max" ranks a candidate by its best passage, agg="sum" by the summed
+    similarity of its matched passages. document holds the matched passages.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"agg must be one of {AGGREGATIONS}")
+    per_query = query_many(query_embeddings, top_k=top_k * max(1, fanout), where=where,
+                           client=client, collection=PASSAGE_COLLECTION)
+    return [_aggregate(hs, top_k, agg) for hs in per_query]
+
+def get_documents(ids: List[str], client=None) -> Dict[str, str]:
+    """Stored Resume_str for the given IDs; unknown IDs are left out."""
+    if not ids:
+        return {}
     client = client or get_client()
     col = get_collection(client)
+    res = col.get(ids=list(ids), include=["documents"])
+    return dict(zip(res["ids"], res["documents"]))
+
+def count(client=None, collection: str = COLLECTION):
+    client = client or get_client()
+    col = get_collection(client, collection)
     return col.count()
+
+class SearchBackend(abc.ABC):
+    """Top-k search over indexed resumes; hits use the same shape as query()."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def search_many(self, query_embeddings, top_k: int = 10, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """One hit list per row of query_embeddings."""
+
+    def search(self, query_embedding, top_k: int = 10, where: Optional[Dict] = None) -> List[Dict]:
+        return self.search_many(to_dense(query_embedding).reshape(1, -1), top_k=top_k, where=where)[0]
+
+class ChromaBackend(SearchBackend):
+    name = "chroma"
+
+    def __init__(self, client=None, chunked: bool = False, agg: str = "max"):
+        self.client = client or get_client()
+        self.chunked = chunked
+        self.agg = agg
+
+    def search_many(self, query_embeddings, top_k: int = 10, where: Optional[Dict] = None) -> List[List[Dict]]:
+        if self.chunked:
+            return query_many_chunked(query_embeddings, top_k=top_k, where=where, client=self.client, agg=self.agg)
+        return query_many(query_embeddings, top_k=top_k, where=where, client=self.client)
+
+QUANTIZATIONS = ("none", "float16", "int8")
+SCAN_BLOCK = 65536
+BUILD_BLOCK = 4096
+
+class NumpyBackend(SearchBackend):
+    """Exact in-process cosine search over the vectors the caller already holds.
+
+    With float16/int8 quantization the scan runs over the compact copy and the
+    best top_k * rerank candidates are rescored exactly from the source
+    embeddings, which are referenced rather than copied (a memmap stays on disk).
+    Distances are squared L2 between unit vectors, i.e. Chroma's default "l2".
+    """
+
+    name = "numpy"
+
+    def __init__(self, records: List[Dict], embeddings, quantization: str = "none", rerank: int = 4):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        self.quantization = quantization
+        self.rerank = max(1, int(rerank))
+        self.source = embeddings
+        self.ids = [id_key(r["ID"]) for r in records]
+        self.documents = [r["Resume_str"] for r in records]
+        self.categories = [r.get("Category", "") for r in records]
+
+        # Normalized and quantized block by block straight into the target array, so
+        # peak memory is the compact matrix plus one float32 block (a memmap is only paged through).
+        n, dim = embeddings.shape
+        dtype = {"int8": np.int8, "float16": np.float16}.get(quantization, np.float32)
+        self.matrix = np.empty((n, dim), dtype=dtype)
+        self.norms = np.empty(n, dtype=np.float32)
+        self.scale = np.empty(n, dtype=np.float32) if quantization == "int8" else None
+        for a in range(0, n, BUILD_BLOCK):
+            b = min(n, a + BUILD_BLOCK)
+            block = np.asarray(to_dense(embeddings[a:b]), dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1)
+            norms[norms == 0] = 1.0
+            self.norms[a:b] = norms
+            block /= norms[:, None]
+            if quantization == "int8":
+                scale = np.abs(block).max(axis=1)
+                scale[scale == 0] = 1.0
+                self.matrix[a:b] = np.round(block / scale[:, None] * 127)
+                self.scale[a:b] = scale / 127
+            else:
+                self.matrix[a:b] = block
+
+        self.masks: Dict[str, np.ndarray] = {}
+        cats = np.asarray(self.categories, dtype=object)
+        for cat in set(self.categories):
+            self.masks[cat] = cats == cat
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        if set(where) != {"Category"}:
+            raise ValueError("NumpyBackend only filters on Category")
+        cond = where["Category"]
+        if isinstance(cond, dict):
+            if set(cond) == {"$eq"}:
+                values = [cond["$eq"]]
+            elif set(cond) == {"$in"}:
+                values = list(cond["$in"])
+            else:
+                raise ValueError(f"Unsupported Category filter: {cond}")
+        else:
+            values = [cond]
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for v in values:
+            if v in self.masks:
+                mask |= self.masks[v]
+        return mask
+
+    def _scores(self, Q: np.ndarray) -> np.ndarray:
+        if self.quantization == "none":
+            return self.matrix @ Q.T
+        # Upcast block by block so BLAS does the work without a full float32 copy.
+        out = np.empty((self.matrix.shape[0], Q.shape[0]), dtype=np.float32)
+        for a in range(0, self.matrix.shape[0], SCAN_BLOCK):
+            b = a + SCAN_BLOCK
+            out[a:b] = self.matrix[a:b].astype(np.float32) @ Q.T
+        if self.scale is not None:
+            out *= self.scale[:, None]
+        return out
+
+    def _exact(self, idx: np.ndarray, q: np.ndarray) -> np.ndarray:
+        rows = np.asarray(to_dense(self.source[idx]), dtype=np.float32)
+        return (rows @ q) / self.norms[idx]
+
+    def search_many(self, query_embeddings, top_k: int = 10, where: Optional[Dict] = None) -> List[List[Dict]]:
+        with metrics.span("query", backend="numpy", quantization=self.quantization) as s:
+            out = self._search_many(query_embeddings, top_k, where)
+            s.set(items=len(out))
+        return out
+
+    def _search_many(self, query_embeddings, top_k: int, where: Optional[Dict]) -> List[List[Dict]]:
+        Q = np.atleast_2d(np.asarray(to_dense(query_embeddings), dtype=np.float32))
+        qn = np.linalg.norm(Q, axis=1, keepdims=True)
+        qn[qn == 0] = 1.0
+        Q = Q / qn
+        n = len(self.ids)
+        if n == 0 or top_k <= 0:
+            return [[] for _ in range(Q.shape[0])]
+
+        mask = self._mask(where)
+        allowed = n if mask is None else int(mask.sum())
+        k = min(top_k, allowed)
+        shortlist = k if self.quantization == "none" else min(allowed, k * self.rerank)
+
+        scores = self._scores(Q)
+        if mask is not None:
+            scores[~mask] = -np.inf
+
+        out = []
+        for j in range(Q.shape[0]):
+            if k == 0:
+                out.append([])
+                continue
+            col = scores[:, j]
+            idx = np.argpartition(-col, shortlist - 1)[:shortlist]
+            sims = col[idx] if self.quantization == "none" else self._exact(idx, Q[j])
+            order = np.argsort(-sims, kind="stable")[:k]
+            out.append([
+                {
+                    "id": self.ids[i],
+                    "document": self.documents[i],
+                    "metadata": {"Category": self.categories[i]},
+                    "distance": float(max(0.0, 2.0 - 2.0 * s)),
+                }
+                for i, s in zip(idx[order], sims[order])
+            ])
+        return out
+
+def make_backend(kind: str, records: Optional[List[Dict]] = None, embeddings=None,
+                 quantization: str = "none", client=None, chunked: bool = False,
+                 agg: str = "max") -> SearchBackend:
+    if kind == "numpy":
+        if records is None or embeddings is None:
+            raise ValueError("NumpyBackend needs records and embeddings")
+        return NumpyBackend(records, embeddings, quantization=quantization)
+    if kind == "chroma":
+        return ChromaBackend(client, chunked=chunked, agg=agg)
+    raise ValueError(f"Unknown search backend: {kind}")
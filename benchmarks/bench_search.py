@@ -0,0 +1,95 @@
+"""Recall/latency of the NumPy search backend (plain and quantized) against Chroma.
+
+    python -m benchmarks.bench_search --rows 100000 --dim 384 --queries 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.vector_store import ChromaBackend, NumpyBackend, get_client, index_records
+
+CATEGORIES = ["IT", "FINANCE", "HR", "SALES", "ENGINEERING", "DESIGNER"]
+
+def make_corpus(rows: int, dim: int, seed: int = 0):
+    """Clustered unit vectors, so top-k neighbours are not all near-ties."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(64, dim)).astype(np.float32)
+    assign = rng.integers(0, len(centers), size=rows)
+    vecs = centers[assign] + 0.6 * rng.normal(size=(rows, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    records = [
+        {"ID": i, "Resume_str": f"resume {i}", "Category": CATEGORIES[i % len(CATEGORIES)]}
+        for i in range(rows)
+    ]
+    return records, vecs
+
+def _recall(got: List[List[Dict]], truth: List[List[str]]) -> float:
+    found = sum(len({h["id"] for h in g} & set(t)) for g, t in zip(got, truth))
+    return found / max(1, sum(len(t) for t in truth))
+
+def _measure(backend, queries: np.ndarray, top_k: int, where=None):
+    lat = []
+    hits = []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits.append(backend.search(q, top_k=top_k, where=where))
+        lat.append(time.perf_counter() - t0)
+    lat_ms = np.array(lat) * 1000
+    return hits, float(np.percentile(lat_ms, 50)), float(np.percentile(lat_ms, 95))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--category", default=None, help="also filter on this Category")
+    ap.add_argument("--skip-chroma", action="store_true")
+    args = ap.parse_args(argv)
+
+    records, vecs = make_corpus(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vecs[rng.choice(args.rows, size=args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    where = {"Category": args.category} if args.category else None
+
+    exact = NumpyBackend(records, vecs)
+    truth = [[h["id"] for h in hs] for hs in exact.search_many(queries, top_k=args.top_k, where=where)]
+
+    backends = [
+        ("numpy", exact),
+        ("numpy-float16", NumpyBackend(records, vecs, quantization="float16")),
+        ("numpy-int8", NumpyBackend(records, vecs, quantization="int8")),
+    ]
+    if not args.skip_chroma:
+        with tempfile.TemporaryDirectory() as d:
+            client = get_client(d)
+            t0 = time.perf_counter()
+            index_records(records, vecs, client=client, batch=5000)
+            print(f"chroma index build: {time.perf_counter() - t0:.1f}s")
+            backends.append(("chroma", ChromaBackend(client)))
+            _report(backends, queries, truth, args)
+    else:
+        _report(backends, queries, truth, args)
+
+def _report(backends, queries, truth, args):
+    where = {"Category": args.category} if args.category else None
+    print(f"rows={args.rows:,} dim={args.dim} queries={len(queries)} top_k={args.top_k} filter={where}")
+    print(f"{'backend':<15}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}{'store MB':>10}")
+    for name, backend in backends:
+        hits, p50, p95 = _measure(backend, queries, args.top_k, where)
+        size = getattr(backend, "matrix", None)
+        mb = f"{size.nbytes / 2**20:10.1f}" if size is not None else f"{'-':>10}"
+        print(f"{name:<15}{_recall(hits, truth):8.3f}{p50:10.2f}{p95:10.2f}{mb}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Concurrent load test for the backend.api search service.
+
+    python -m benchmarks.load_api --spawn --rows 20000 --concurrency 16 --requests 2000
+    python -m benchmarks.load_api --url http://127.0.0.1:8000 --endpoint batch --batch-size 16
+
+With --spawn a synthetic export is written to a temporary directory and the
+service is started in-process (numpy backend, offline embedder, caches
+isolated). Queries are drawn from a fixed pool with random suffixes so the
+query cache only absorbs a share of the traffic (see --repeat-ratio).
+Reports throughput and p50/p95/p99 latency per endpoint as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+TERMS = [
+    "python", "java", "sap", "payroll", "nurse", "react", "aws", "kubernetes", "sales",
+    "accountant", "teacher", "designer", "marketing", "audit", "finance", "engineer",
+    "manager", "senior", "junior", "lead", "consultant", "analyst", "developer", "hr",
+]
+
+def _queries(n: int, repeat_ratio: float, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    pool = [" ".join(rng.sample(TERMS, 3)) for _ in range(50)]
+    out = []
+    for i in range(n):
+        q = rng.choice(pool)
+        if rng.random() >= repeat_ratio:
+            q = f"{q} {rng.choice(TERMS)} {i}"
+        out.append(q)
+    return out
+
+def _spawn(rows: int, workdir: str, port: int) -> str:
+    # Keep every on-disk cache inside workdir; must happen before backend.config is imported.
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "cache", "embeddings.sqlite")
+    import uvicorn
+    from backend.api import create_app
+    from benchmarks.synthetic import write_export
+
+    source = write_export(os.path.join(workdir, "Resume.csv"), rows)
+    app = create_app(source=source, use_engine=False, search_kind="numpy",
+                     bm25_path=os.path.join(workdir, "bm25.npz"), summaries=None)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("service did not become healthy")
+
+def _summary(latencies: List[float], errors: int, wall: float) -> Dict:
+    lat = np.asarray(latencies) * 1000.0
+    if not len(lat):
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": int(len(lat)),
+        "errors": errors,
+        "rps": round(len(lat) / wall, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "max_ms": round(float(lat.max()), 2),
+    }
+
+def run_load(url: str, endpoint: str, queries: List[str], concurrency: int,
+             top_k: int, mode: str, batch_size: int) -> Dict:
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency))
+    if endpoint == "batch":
+        payloads = [
+            ("/search/batch", {"queries": queries[i:i + batch_size], "top_k": top_k, "mode": mode})
+            for i in range(0, len(queries), batch_size)
+        ]
+    elif endpoint == "candidate":
+        ids = [h["id"] for h in session.post(f"{url}/search", json={"query": queries[0], "top_k": 50}).json()["hits"]]
+        payloads = [(f"/candidates/{ids[i % len(ids)]}", None) for i in range(len(queries))]
+    else:
+        payloads = [("/search", {"query": q, "top_k": top_k, "mode": mode}) for q in queries]
+
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = [0]
+
+    def one(item):
+        path, body = item
+        t0 = time.perf_counter()
+        try:
+            resp = session.get(f"{url}{path}") if body is None else session.post(f"{url}{path}", json=body)
+            ok = resp.ok
+        except requests.RequestException:
+            ok = False
+        dt = time.perf_counter() - t0
+        with lock:
+            if ok:
+                latencies.append(dt)
+            else:
+                errors[0] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, payloads))
+    return _summary(latencies, errors[0], time.perf_counter() - t0)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--url", default=None, help="service to test; omit with --spawn")
+    ap.add_argument("--spawn", action="store_true", help="start the service in-process on a synthetic export")
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--endpoint", choices=["search", "batch", "candidate", "all"], default="all")
+    ap.add_argument("--mode", choices=["hybrid", "dense", "keyword"], default="hybrid")
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--repeat-ratio", type=float, default=0.3, help="share of queries repeated from the pool")
+    ap.add_argument("--warmup", type=int, default=50)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+
+    if not args.url and not args.spawn:
+        ap.error("pass --url or --spawn")
+    workdir = tempfile.mkdtemp(prefix="cv-load-") if args.spawn else None
+    url = _spawn(args.rows, workdir, args.port) if args.spawn else args.url.rstrip("/")
+    print(json.dumps(requests.get(f"{url}/health").json()), file=sys.stderr)
+
+    endpoints = ["search", "batch", "candidate"] if args.endpoint == "all" else [args.endpoint]
+    results = {"url": url, "concurrency": args.concurrency, "mode": args.mode, "endpoints": {}}
+    for endpoint in endpoints:
+        run_load(url, endpoint, _queries(args.warmup, args.repeat_ratio, seed=1), args.concurrency,
+                 args.top_k, args.mode, args.batch_size)
+        results["endpoints"][endpoint] = run_load(
+            url, endpoint, _queries(args.requests, args.repeat_ratio), args.concurrency,
+            args.top_k, args.mode, args.batch_size,
+        )
+        print(f"{endpoint:10s} {results['endpoints'][endpoint]}", file=sys.stderr)
+
+    out = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out)
+    print(out)
+
+if __name__ == "__main__":
+    main()
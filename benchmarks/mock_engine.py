@@ -0,0 +1,134 @@
+"""Local stand-in for the generative engine's OpenAI-style API.
+
+Serves POST /embeddings and POST /chat/completions (plain JSON or SSE with
+"stream": true) so EngineClient, EngineEmbedder and answer_query can be run
+without the real service:
+
+    python -m benchmarks.mock_engine --port 8765 --token-delay-ms 20
+    GENERATIVE_ENGINE_BASE_URL=http://127.0.0.1:8765 GENERATIVE_ENGINE_API_KEY=x streamlit run frontend/app.py
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+import numpy as np
+
+DEFAULT_ANSWER = (
+    "Based on the provided resumes, the strongest matches are listed below. "
+    "Each candidate is ranked by relevance to the query."
+)
+
+def fake_embedding(text: str, dim: int) -> list:
+    """Deterministic unit vector per text, so repeated runs are comparable."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+    v = np.random.default_rng(seed).normal(size=dim)
+    return (v / np.linalg.norm(v)).astype(np.float32).tolist()
+
+class MockEngineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Overridden per server by make_server().
+    dim = 256
+    latency = 0.0
+    token_delay = 0.0
+    answer = DEFAULT_ANSWER
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, code: int, body: dict):
+        out = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._json(400, {"error": "invalid JSON"})
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.endswith("/embeddings"):
+            inputs = body.get("input") or []
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            data = [{"index": i, "embedding": fake_embedding(t, self.dim)} for i, t in enumerate(inputs)]
+            return self._json(200, {"data": data, "model": body.get("model")})
+
+        if self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return self._stream_chat()
+            return self._json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": self.answer}}]})
+
+        self._json(404, {"error": f"unknown path {self.path}"})
+
+    def _stream_chat(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in self.answer.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            if self.token_delay:
+                time.sleep(self.token_delay)
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+class MockEngineServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop keep-alive connections after a stream; that is not an error here.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def make_server(host: str = "127.0.0.1", port: int = 0, dim: int = 256, latency_ms: float = 0.0,
+                token_delay_ms: float = 0.0, answer: str = DEFAULT_ANSWER) -> MockEngineServer:
+    handler = type("ConfiguredMockEngineHandler", (MockEngineHandler,), {
+        "dim": dim,
+        "latency": latency_ms / 1000.0,
+        "token_delay": token_delay_ms / 1000.0,
+        "answer": answer,
+    })
+    return MockEngineServer((host, port), handler)
+
+def start_mock_engine(**kwargs) -> Tuple[MockEngineServer, str]:
+    """Start a server on a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="delay before every response")
+    ap.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed tokens")
+    args = ap.parse_args(argv)
+    server = make_server(args.host, args.port, args.dim, args.latency_ms, args.token_delay_ms)
+    print(f"Mock engine on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Time every pipeline stage on synthetic exports and write machine-readable JSON.
+
+    python -m benchmarks.run_pipeline --sizes 1000 10000 100000 --format csv --out bench.json
+    python -m benchmarks.run_pipeline --sizes 10000 --engine-latency-ms 80 --baseline bench.json
+
+Stages: read (_read_any), load (load_resumes_with_stats), dedup
+(find_near_duplicates), html (extract_texts, cold), tfidf_fit / tfidf_embed
+(OfflineEmbedder), index (index_records into a temporary Chroma), query, and,
+against the local mock engine, engine_embed (EngineEmbedder) and answer
+(answer_query, blocking and streamed time-to-first-token). All persistent
+caches are disabled so every run measures cold work.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# Cold numbers only: must be set before backend.config is imported.
+os.environ["HTML_CACHE_PATH"] = ""
+os.environ["FRAME_CACHE_DIR"] = ""
+
+import numpy as np
+
+from backend.embeddings import EngineEmbedder, OfflineEmbedder
+from backend.engine_client import EngineClient
+from backend.file_processor import _read_any, load_resumes_with_stats
+from backend.dedup import find_near_duplicates
+from backend.html_extract import extract_texts
+from backend.summarizer import answer_query
+from backend.vector_store import get_client, index_records, query_many
+from benchmarks.mock_engine import start_mock_engine
+from benchmarks.synthetic import write_export
+
+QUERIES = [
+    "Senior Python developer with AWS and Kubernetes",
+    "SAP FICO consultant",
+    "payroll and tax audit specialist",
+    "React and node.js frontend lead",
+    "nurse with patient care experience",
+]
+STAGES = ["read", "load", "dedup", "html", "tfidf_fit", "tfidf_embed", "index", "query", "engine_embed", "answer"]
+
+class StageTimer:
+    def __init__(self, skip: List[str]):
+        self.skip = set(skip)
+        self.results: Dict[str, Dict] = {}
+
+    def run(self, name: str, fn: Callable, items: Optional[int] = None, repeat: int = 1):
+        if name in self.skip:
+            return None
+        best, out = float("inf"), None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        entry = {"seconds": round(best, 6)}
+        if items is not None:
+            entry["items"] = int(items)
+            entry["items_per_sec"] = round(items / best, 2) if best > 0 else None
+        self.results[name] = entry
+        print(f"  {name:<14}{best:10.3f}s" + (f"  ({items:,} items)" if items is not None else ""), flush=True)
+        return out
+
+def bench_size(rows: int, fmt: str, args, workdir: str) -> Dict:
+    path = os.path.join(workdir, f"resumes_{rows}.{fmt}")
+    t0 = time.perf_counter()
+    write_export(path, rows, html_ratio=args.html_ratio, seed=args.seed)
+    print(f"[{rows:,} rows, {fmt}] generated in {time.perf_counter() - t0:.1f}s ({os.path.getsize(path):,} bytes)")
+
+    timer = StageTimer(args.skip)
+    if "index" in timer.skip:
+        timer.skip.add("query")
+    timer.run("read", lambda: _read_any(path), rows)
+    loaded = timer.run("load", lambda: load_resumes_with_stats(path), rows)
+    records, stats = loaded or load_resumes_with_stats(path)
+    timer.run("dedup", lambda: find_near_duplicates(records), len(records))
+
+    df = _read_any(path)
+    htmls = [str(h) for h in df["Resume_html"].dropna().tolist()]
+    timer.run("html", lambda: extract_texts(htmls, cache_path=None), len(htmls))
+
+    texts = [r["Resume_str"] for r in records]
+    embedder = OfflineEmbedder(sparse=True)
+    timer.run("tfidf_fit", lambda: embedder.fit(texts), len(texts))
+    if not embedder.fitted:
+        embedder.fit(texts)
+    vectors = timer.run("tfidf_embed", lambda: embedder.embed_batch(texts), len(texts))
+    if vectors is None:
+        vectors = embedder.embed_batch(texts)
+
+    q_vecs = np.vstack([embedder.embed(q).toarray() for q in QUERIES])
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        client = get_client(chroma_dir)
+        timer.run("index", lambda: index_records(records, vectors, client=client, batch=5000), len(records))
+        hits = timer.run("query", lambda: query_many(q_vecs, top_k=10, client=client), len(QUERIES), repeat=3)
+
+    if "engine_embed" not in timer.skip or "answer" not in timer.skip:
+        server, url = start_mock_engine(dim=args.engine_dim, latency_ms=args.engine_latency_ms,
+                                        token_delay_ms=args.token_delay_ms)
+        try:
+            client = EngineClient(api_key="bench", base_url=url)
+            engine_texts = texts[:args.engine_rows] if args.engine_rows else texts
+            eng = EngineEmbedder(model="mock-embedding", client=client)
+            timer.run("engine_embed", lambda: eng.embed_batch(engine_texts), len(engine_texts))
+
+            sample_hits = (hits or [[]])[0] or [
+                {"id": str(r["ID"]), "document": r["Resume_str"], "metadata": {"Category": r["Category"]}}
+                for r in records[:10]
+            ]
+            timer.run("answer", lambda: answer_query(QUERIES[0], sample_hits, client=client))
+            if "answer" not in timer.skip:
+                t0 = time.perf_counter()
+                stream = answer_query(QUERIES[0], sample_hits, stream=True, client=client)
+                next(iter(stream), None)
+                ttft = time.perf_counter() - t0
+                for _ in stream:
+                    pass
+                timer.results["answer"]["ttft_seconds"] = round(ttft, 6)
+                print(f"  {'answer_ttft':<14}{ttft:10.3f}s")
+        finally:
+            server.shutdown()
+
+    return {"rows": rows, "format": fmt, "file_bytes": os.path.getsize(path), "load_stats": {
+        k: v for k, v in stats.items() if k != "source_path"
+    }, "stages": timer.results}
+
+def compare(current: Dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {(r["rows"], r["format"]): r["stages"] for r in baseline.get("runs", [])}
+    print(f"\nvs baseline {baseline_path} (ratio > 1 means slower now)")
+    for run in current["runs"]:
+        old = base.get((run["rows"], run["format"]))
+        if not old:
+            continue
+        for stage, entry in run["stages"].items():
+            prev = (old.get(stage) or {}).get("seconds")
+            if prev:
+                print(f"  [{run['rows']:,} {run['format']}] {stage:<14}{entry['seconds'] / prev:6.2f}x")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    ap.add_argument("--html-ratio", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--skip", nargs="*", default=[], choices=STAGES)
+    ap.add_argument("--engine-latency-ms", type=float, default=50.0)
+    ap.add_argument("--token-delay-ms", type=float, default=15.0)
+    ap.add_argument("--engine-dim", type=int, default=256)
+    ap.add_argument("--engine-rows", type=int, default=2000, help="cap texts sent to the mock engine (0 = all)")
+    ap.add_argument("--workdir", default=None, help="where synthetic files go (default: temp dir)")
+    ap.add_argument("--out", default=None, help="write JSON here (default: stdout)")
+    ap.add_argument("--baseline", default=None, help="earlier JSON to compare against")
+    args = ap.parse_args(argv)
+
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "workdir")},
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        for rows in args.sizes:
+            result["runs"].append(bench_size(rows, args.format, args, workdir))
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"\nwrote {args.out}")
+    else:
+        print(text)
+    if args.baseline:
+        compare(result, args.baseline)
+
+if __name__ == "__main__":
+    main()
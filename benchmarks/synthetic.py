@@ -0,0 +1,79 @@
+"""Synthetic resume exports for benchmarks.
+
+    python -m benchmarks.synthetic --rows 100000 --html-ratio 0.3 --out data/bench/Resume_100k.csv
+"""
+import argparse
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+WORDS = (
+    "python java sql aws docker kubernetes sap fico accounting sales manager "
+    "engineer analyst developer senior junior lead team project budget client "
+    "terraform react node.js c++ excel marketing recruiting payroll audit tax "
+    "design figma photoshop logistics supply chain nurse patient teacher"
+).split()
+CATEGORIES = ["IT", "FINANCE", "HR", "SALES", "ENGINEERING", "DESIGNER", "HEALTHCARE", "TEACHER"]
+XLSX_MAX_ROWS = 1_048_575
+
+def _texts(rng: np.random.Generator, rows: int, min_words: int, max_words: int) -> List[str]:
+    lengths = rng.integers(min_words, max_words + 1, size=rows)
+    words = np.asarray(WORDS)
+    flat = words[rng.integers(0, len(words), size=int(lengths.sum()))]
+    out, pos = [], 0
+    for n in lengths:
+        out.append(" ".join(flat[pos:pos + n]))
+        pos += n
+    return out
+
+def _html(text: str) -> str:
+    half = len(text) // 2
+    return (
+        "<html><head><style>p{margin:0}</style><script>var x=1;</script></head>"
+        f"<body><div class='section'><h2>Summary</h2><p>{text[:half]}</p></div>"
+        f"<div class='section'><h2>Experience</h2><p>{text[half:]}</p></div></body></html>"
+    )
+
+def make_frame(rows: int, html_ratio: float = 0.3, seed: int = 0,
+               min_words: int = 150, max_words: int = 600, missing_id_ratio: float = 0.005) -> pd.DataFrame:
+    """Resume export with ID / Resume_str / Resume_html / Category.
+
+    html_ratio of the rows only carry Resume_html (Resume_str empty), so they
+    go through HTML extraction; the rest carry both columns.
+    """
+    rng = np.random.default_rng(seed)
+    texts = _texts(rng, rows, min_words, max_words)
+    html_only = rng.random(rows) < html_ratio
+    ids = np.arange(1, rows + 1, dtype=float)
+    ids[rng.random(rows) < missing_id_ratio] = np.nan
+    return pd.DataFrame({
+        "ID": pd.array(ids, dtype="Int64"),
+        "Resume_str": [None if h else t for t, h in zip(texts, html_only)],
+        "Resume_html": [_html(t) for t in texts],
+        "Category": rng.choice(CATEGORIES, size=rows),
+    })
+
+def write_export(path: str, rows: int, html_ratio: float = 0.3, seed: int = 0, **kwargs) -> str:
+    df = make_frame(rows, html_ratio, seed, **kwargs)
+    os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+    if path.lower().endswith((".xlsx", ".xls")):
+        if rows > XLSX_MAX_ROWS:
+            raise ValueError(f"XLSX holds at most {XLSX_MAX_ROWS:,} data rows")
+        df.to_excel(path, index=False, engine="openpyxl")
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1000)
+    ap.add_argument("--html-ratio", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True, help=".csv or .xlsx")
+    args = ap.parse_args(argv)
+    print(write_export(args.out, args.rows, args.html_ratio, args.seed))
+
+if __name__ == "__main__":
+    main()
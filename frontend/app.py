@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 import requests
 import numpy as np
 import pandas as pd
@@ -10,14 +11,21 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from backend.file_processor import load_resumes_with_stats, load_resumes
-from backend.embeddings import OfflineEmbedder, EngineEmbedder
+from backend.dataset import load_dataset, clear_datasets
+from backend.embeddings import EngineEmbedder, offline_model_name
 from backend.vector_store import (
-    get_client, reset_collection, index_records,
-    query as chroma_query, count as chroma_count,
+    get_client, reset_collection, sync_records,
+    count as chroma_count, make_backend, QUANTIZATIONS,
+    chunk_records, PASSAGE_COLLECTION, AGGREGATIONS,
 )
-from backend.config import USE_ENGINE_EMBEDDINGS, EMBEDDING_MODEL
+from backend.config import USE_ENGINE_EMBEDDINGS, EMBEDDING_MODEL, SEARCH_BACKEND, SEARCH_QUANTIZATION, OFFLINE_LSA_DIM
 from backend.summarizer import answer_query
+from backend.snapshots import load_snapshot, save_snapshot, file_signature, offline_embedder_for
+from backend.embedding_cache import EmbeddingCache
+from backend.lexical import BM25Index, reciprocal_rank_fusion
+from backend.query_cache import QueryCache, vector_digest
+from backend.summaries import SummaryStore, summarize_records, attach_summaries
+from backend import metrics
 
 st.set_page_config(page_title="Offline CV Analyzer (Engine + ChromaDB)", layout="wide")
 st.title("Offline CV Analyzer (CSV/XLSX • HTML+STR • Engine Embeddings + ChromaDB)")
@@ -25,6 +33,7 @@ st.title("Offline CV Analyzer (CSV/XLSX • HTML+STR • Engine Embeddings + Chr
 DATA_DIR = os.path.join(PROJECT_ROOT, "data", "uploads", "csv")
 os.makedirs(DATA_DIR, exist_ok=True)
 DEFAULT_PATH = os.path.join(DATA_DIR, "Resume.csv")
+PAGE_SIZE = 200
 
 # ---- Session state ----
 if "resumes_reload" not in st.session_state:
@@ -32,31 +41,63 @@ if "resumes_reload" not in st.session_state:
 if "current_source" not in st.session_state:
     st.session_state["current_source"] = DEFAULT_PATH
 
-# embeddings cache
-if "embeddings_sig" not in st.session_state:
-    st.session_state["embeddings_sig"] = None
-if "embedder_obj" not in st.session_state:
-    st.session_state["embedder_obj"] = None
-if "vectors_arr" not in st.session_state:
-    st.session_state["vectors_arr"] = None
-if "embedder_kind" not in st.session_state:
-    st.session_state["embedder_kind"] = None
-if "embedder_model" not in st.session_state:
-    st.session_state["embedder_model"] = None
-
 # chroma cache
-if "indexed_sig" not in st.session_state:
-    st.session_state["indexed_sig"] = None
 if "pending_reindex" not in st.session_state:
     st.session_state["pending_reindex"] = False
 
-def file_signature(path: str, records_len: int, kind: str, model: str) -> tuple:
-    try:
-        mtime = os.path.getmtime(path)
-        size = os.path.getsize(path)
-    except OSError:
-        mtime, size = 0.0, 0
-    return (os.path.abspath(path), round(mtime, 3), size, int(records_len), kind, model)
+@st.cache_resource
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache()
+
+@st.cache_resource
+def get_shared_state() -> dict:
+    # Process-wide: every session reuses the same embeddings, indexes and search backends.
+    # Sessions run in their own threads, so every read or change goes through the lock.
+    return {"lock": threading.Lock(), "embeddings": {}, "backends": {}, "bm25": {},
+            "indexed": set(), "passages": set()}
+
+shared = get_shared_state()
+
+def recall(store: dict, key):
+    """Value of key in a shared store, None when it is missing."""
+    with shared["lock"]:
+        return store.get(key)
+
+def remember(store: dict, key, value, keep: int = 2):
+    """Put value in a shared store, keeping only the keep most recent keys.
+
+    When another session stored key first, its value is kept and returned.
+    """
+    with shared["lock"]:
+        value = store.setdefault(key, value)
+        while len(store) > keep:
+            store.pop(next(iter(store)))
+        return value
+
+def is_marked(marks: set, sig) -> bool:
+    with shared["lock"]:
+        return sig in marks
+
+def mark_only(marks: set, sig):
+    """Record sig as the only signature the shared index currently holds."""
+    with shared["lock"]:
+        marks.clear()
+        marks.add(sig)
+
+def clear_shared():
+    with shared["lock"]:
+        for name, store in shared.items():
+            if name != "lock":
+                store.clear()
+
+@st.cache_resource
+def get_summary_store() -> SummaryStore:
+    return SummaryStore()
+
+@st.cache_resource
+def get_query_cache(persist: bool) -> QueryCache:
+    # Shared by every session, so repeated queries from different users are instant too.
+    return QueryCache(persist=persist)
 
 # ------------- Upload -------------
 with st.expander("Upload resumes file (CSV/XLSX) or by link", expanded=True):
@@ -68,11 +109,14 @@ with st.expander("Upload resumes file (CSV/XLSX) or by link", expanded=True):
     with col_u2:
         if st.button("Clear cache"):
             st.cache_data.clear()
+            clear_datasets()
+            clear_shared()
             st.success("Streamlit cache cleared.")
     with col_u3:
         if st.button("Reset ChromaDB (manual)"):
             reset_collection(get_client())
-            st.session_state["indexed_sig"] = None
+            with shared["lock"]:
+                shared["indexed"].clear()
             st.success("ChromaDB collection reset.")
 
     # Save uploaded file (preserve extension) and mark for reindex
@@ -85,11 +129,8 @@ with st.expander("Upload resumes file (CSV/XLSX) or by link", expanded=True):
         st.session_state["current_source"] = target
         st.session_state["resumes_reload"] = True
 
-        # Reset collection immediately on upload
-        reset_collection(get_client())
-        st.session_state["indexed_sig"] = None
+        # Collection is synced against the new file (upsert/delete by ID + content hash)
         st.session_state["pending_reindex"] = True
-        st.session_state["embeddings_sig"] = None
 
     elif url_upload and upload_btn:
         try:
@@ -104,11 +145,7 @@ with st.expander("Upload resumes file (CSV/XLSX) or by link", expanded=True):
             st.success(f"Downloaded → {target}")
             st.session_state["current_source"] = target
             st.session_state["resumes_reload"] = True
-
-            reset_collection(get_client())
-            st.session_state["indexed_sig"] = None
             st.session_state["pending_reindex"] = True
-            st.session_state["embeddings_sig"] = None
         except Exception as e:
             st.error(f"Download failed: {e}")
 
@@ -125,20 +162,43 @@ with st.expander("Data loading & embedding options"):
     force_fresh = st.checkbox("Force reload with progress", value=False)
     use_engine = st.checkbox("Use corporate engine for embeddings (recommended)", value=USE_ENGINE_EMBEDDINGS)
     engine_model = st.text_input("Embedding model (engine)", EMBEDDING_MODEL)
+    lsa_dim = int(st.number_input(
+        "Offline LSA dimensions (0 = sparse TF-IDF)", min_value=0, max_value=1024, value=OFFLINE_LSA_DIM, step=32,
+        help="Project offline TF-IDF vectors to dense LSA components: smaller index, faster search.",
+    ))
+    persist_query_cache = st.checkbox("Persist query/answer cache to disk", value=False)
+    search_kind = st.selectbox(
+        "Search backend", ["chroma", "numpy"], index=0 if SEARCH_BACKEND != "numpy" else 1,
+        help="numpy searches the in-memory vectors directly; chroma queries the persisted collection.",
+    )
+    search_quant = st.selectbox(
+        "In-memory vector storage (numpy backend)", list(QUANTIZATIONS),
+        index=list(QUANTIZATIONS).index(SEARCH_QUANTIZATION) if SEARCH_QUANTIZATION in QUANTIZATIONS else 0,
+    )
+    use_chunks = st.checkbox(
+        "Passage-level index (chroma backend)", value=False,
+        help="Index overlapping passages and rank candidates by their best (max) or total (sum) passage match.",
+    )
+    chunk_agg = st.selectbox("Passage score aggregation", list(AGGREGATIONS))
+    use_summaries = st.checkbox(
+        "Use stored resume summaries in results and answers", value=True,
+        help="Summaries are precomputed below or with `python -m backend.summaries`.",
+    )
 
-def load_with_progress(p: str):
+def load_with_progress(p: str, refresh: bool):
     with st.status("Loading resumes…", expanded=True) as s:
         s.write("Stage: Reading file and merging Resume_str / Resume_html")
-        records, stats = load_resumes_with_stats(p)
+        dataset = load_dataset(p, refresh=refresh)
         s.update(label="Resumes loaded", state="complete", expanded=False)
-    return records, stats
+    return dataset
 
+# Parsed once per file version and shared by every session (see backend.dataset)
 if st.session_state["resumes_reload"] or force_fresh:
-    records, stats = load_with_progress(source_path)
+    dataset = load_with_progress(source_path, refresh=force_fresh)
     st.session_state["resumes_reload"] = False
 else:
-    records = load_resumes(source_path)
-    _, stats = load_resumes_with_stats(source_path)
+    dataset = load_dataset(source_path)
+records, stats = dataset.records, dataset.stats
 
 if not records:
     st.info(
@@ -163,51 +223,57 @@ st.caption(
     f"Rows missing ID: {stats.get('rows_missing_id',0):,} • "
     f"Used (valid) resumes: {stats.get('rows_used',0):,} • "
     f"non-empty HTML: {stats.get('html_non_empty',0):,} • non-empty STR: {stats.get('str_non_empty',0):,}"
+    + (f" • Near-duplicates: {stats['near_duplicates']:,} in {stats.get('duplicate_clusters',0):,} clusters"
+       if stats.get("near_duplicates") else "")
 )
 
 # -------- Build embeddings (cached: signature includes embedder kind + model) --------
-texts = [r["Resume_str"] for r in records]
+# One representative per near-duplicate cluster is embedded and indexed (see backend.dedup).
+records = dataset.unique
+texts = dataset.unique_texts
 kind = "engine" if use_engine else "offline"
-model_name = engine_model if use_engine else "tfidf-384"
+model_name = engine_model if use_engine else offline_model_name(lsa_dim)
 current_sig = file_signature(source_path, len(records), kind, model_name)
 
-need_embeddings = (
-    st.session_state["embeddings_sig"] != current_sig or
-    st.session_state["embedder_obj"] is None or
-    st.session_state["vectors_arr"] is None or
-    st.session_state["embedder_kind"] != kind or
-    st.session_state["embedder_model"] != model_name
-)
-
-if need_embeddings:
-    with st.status("Building embeddings…", expanded=True) as status:
-        if use_engine:
-            status.write(f"Embedding via engine model: {engine_model}")
-            embedder = EngineEmbedder(model=engine_model)
-            # no fit; directly embed with progress
-            prog = st.progress(0, text=f"Embedding 0/{len(texts)}")
-            vectors = embedder.embed_batch_with_progress(
-                texts,
-                update=lambda i, total, _: prog.progress(i / total, text=f"Embedding {i}/{total}")
+cached = recall(shared["embeddings"], current_sig)
+if cached is None:
+    snapshot = load_snapshot(current_sig)
+    if snapshot is not None:
+        embedder, vectors = snapshot
+        st.caption("Embeddings memory-mapped from snapshot.")
+    else:
+        with st.status("Building embeddings…", expanded=True) as status:
+            if use_engine:
+                status.write(f"Embedding via engine model: {engine_model}")
+                embedder = EngineEmbedder(model=engine_model, cache=get_embedding_cache())
+                # no fit; directly embed with progress
+                prog = st.progress(0, text=f"Embedding 0/{len(texts)}")
+                vectors = embedder.embed_batch_with_progress(
+                    texts,
+                    update=lambda i, total, _: prog.progress(i / total, text=f"Embedding {i}/{total}")
+                )
+                prog.empty()
+            else:
+                status.write(f"Vectorizing {len(texts):,} resumes with TF‑IDF "
+                             f"(offline, {f'LSA {lsa_dim}' if lsa_dim else 'sparse'}; "
+                             f"vocabulary reused from earlier versions of this file unless it changed a lot)")
+                embedder, vectors = offline_embedder_for(source_path, texts, lsa_dim=lsa_dim,
+                                                         cache=get_embedding_cache(), refit=force_fresh)
+
+            cache_stats = get_embedding_cache().stats()
+            status.write(
+                f"Embedding cache: {cache_stats['hits']:,} hits • {cache_stats['misses']:,} misses • "
+                f"{cache_stats['items']:,}/{cache_stats['max_items']:,} stored"
             )
-            prog.empty()
-        else:
-            status.write("Fitting TF‑IDF (offline)")
-            embedder = OfflineEmbedder()
-            embedder.fit(texts)
-            status.write(f"Vectorizing {len(texts):,} resumes")
-            vectors = embedder.embed_batch(texts)
-
-        status.update(label="Embeddings ready", state="complete", expanded=False)
-
-    st.session_state["embedder_obj"] = embedder
-    st.session_state["vectors_arr"] = vectors
-    st.session_state["embeddings_sig"] = current_sig
-    st.session_state["embedder_kind"] = kind
-    st.session_state["embedder_model"] = model_name
+            try:
+                save_snapshot(current_sig, kind, embedder, vectors)
+            except OSError as e:
+                status.write(f"Snapshot not saved: {e}")
+            status.update(label="Embeddings ready", state="complete", expanded=False)
+
+    embedder, vectors = remember(shared["embeddings"], current_sig, (embedder, vectors))
 else:
-    embedder = st.session_state["embedder_obj"]
-    vectors = st.session_state["vectors_arr"]
+    embedder, vectors = cached
 
 st.caption(f"In‑memory vectors: {vectors.shape[0]:,} × {vectors.shape[1]} (via {kind}: {model_name})")
 
@@ -220,40 +286,104 @@ except Exception:
 need_index = (
     st.session_state.get("pending_reindex", False) or
     col_count == 0 or
-    st.session_state.get("indexed_sig") != current_sig
+    not is_marked(shared["indexed"], current_sig)
 )
 
 if need_index:
     with st.status("Indexing into ChromaDB…", expanded=True) as s:
         client = get_client()
-        # If not a fresh upload but signature changed while collection exists, reset for safety
-        if not st.session_state.get("pending_reindex", False) and col_count > 0:
-            reset_collection(client)
-        total_indexed = index_records(records, vectors, client=client, batch=1000)
-        st.session_state["indexed_sig"] = current_sig
+        # Incremental: only new/changed IDs are upserted and vanished IDs deleted
+        sync = sync_records(records, vectors, client=client, batch=1000, embedding_tag=embedder.model_id)
+        mark_only(shared["indexed"], current_sig)
         st.session_state["pending_reindex"] = False
-        s.write(f"Indexed {total_indexed:,} resumes.")
+        s.write(
+            f"Indexed {sync['total']:,} resumes "
+            f"(added {sync['added']:,} • updated {sync['updated']:,} • "
+            f"deleted {sync['deleted']:,} • unchanged {sync['unchanged']:,})."
+        )
         s.update(label="ChromaDB ready", state="complete", expanded=False)
 
 st.caption(f"Chroma collection size: {chroma_count(get_client()):,}")
 
+# -------- Passage index (optional, synced like the resume collection) --------
+if use_chunks and search_kind == "chroma" and not is_marked(shared["passages"], current_sig):
+    with st.status("Indexing passages into ChromaDB…", expanded=True) as s:
+        passages = chunk_records(records)
+        s.write(f"Embedding {len(passages):,} passages")
+        prog = st.progress(0, text="Embedding passages")
+        p_vectors = embedder.embed_batch_with_progress(
+            [p["Resume_str"] for p in passages],
+            update=lambda i, total, _: prog.progress(i / max(total, 1), text=f"Embedding passages {i}/{total}"),
+        )
+        prog.empty()
+        sync = sync_records(
+            passages, p_vectors, client=get_client(), batch=1000,
+            embedding_tag=embedder.model_id, collection=PASSAGE_COLLECTION,
+        )
+        mark_only(shared["passages"], current_sig)
+        s.write(f"Indexed {sync['total']:,} passages (added {sync['added']:,} • deleted {sync['deleted']:,}).")
+        s.update(label="Passage index ready", state="complete", expanded=False)
+
+chunked = use_chunks and search_kind == "chroma"
+backend_sig = (current_sig, search_kind, search_quant, chunked, chunk_agg)
+search_backend = recall(shared["backends"], backend_sig)
+if search_backend is None:
+    search_backend = remember(shared["backends"], backend_sig, make_backend(
+        search_kind, records, vectors, quantization=search_quant, client=get_client(),
+        chunked=chunked, agg=chunk_agg,
+    ))
+
+# -------- BM25 keyword index (persisted next to the Chroma data) --------
+# The keyword index only depends on the source data, not on the embedder.
+bm25_sig = repr(current_sig[:4])
+bm25_index = recall(shared["bm25"], bm25_sig)
+if bm25_index is None:
+    bm25_index = BM25Index.load(signature=bm25_sig)
+    if bm25_index is None:
+        with st.spinner("Building BM25 keyword index…"):
+            bm25_index = BM25Index.build(records, signature=bm25_sig)
+            bm25_index.save()
+    else:
+        bm25_index.documents = texts
+    bm25_index = remember(shared["bm25"], bm25_sig, bm25_index)
+
+# -------- Resume summaries (precomputed, keyed by content hash) --------
+with st.expander("Resume summaries"):
+    st.caption(f"Stored summaries: {get_summary_store().count():,} (only new or changed resumes are sent to the engine)")
+    if st.button("Summarize new/changed resumes"):
+        prog = st.progress(0, text="Summarizing")
+        try:
+            summary_stats = summarize_records(
+                records, store=get_summary_store(),
+                update=lambda i, total, _: prog.progress(i / max(total, 1), text=f"Summarizing {i}/{total}"),
+            )
+            prog.empty()
+            st.success(
+                f"Summarized {summary_stats['summarized']:,} • already stored {summary_stats['cached']:,} • "
+                f"failed {summary_stats['failed']:,}"
+            )
+        except Exception as e:
+            prog.empty()
+            st.error(f"Summarization failed: {e}")
+
 # -------- UI --------
-tab1, tab2 = st.tabs(["All Candidates", "Semantic Search (Engine + ChromaDB)"])
+tab1, tab2, tab3 = st.tabs(["All Candidates", "Semantic Search (Engine + ChromaDB)", "Metrics"])
 
 with tab1:
     st.header("All Candidates")
-    df = pd.DataFrame(records)
-    st.dataframe(df[["ID", "Category", "Resume_str"]].head(200))
+    # Only the visible page is turned into a DataFrame
+    pages = dataset.page_count(PAGE_SIZE)
+    page_no = st.number_input(f"Page (1–{pages:,}, {PAGE_SIZE} per page)", min_value=1, max_value=pages, value=1, step=1)
+    st.dataframe(dataset.page(int(page_no) - 1, PAGE_SIZE))
     candidate_id = st.text_input("View candidate by ID")
     if candidate_id:
-        try:
-            cid = int(candidate_id)
-        except Exception:
-            cid = candidate_id
-        cand = next((r for r in records if r["ID"] == cid), None)
+        cand = dataset.get(candidate_id)
         if cand:
             st.write(f"**ID:** {cand['ID']}")
             st.write(f"**Category:** {cand['Category']}")
+            duplicates = dataset.duplicates(candidate_id)
+            if duplicates:
+                st.caption(f"Near-duplicate resumes: IDs {', '.join(duplicates)}")
             st.write("**Extracted/Provided Resume Text:**")
             st.write(cand["Resume_str"])
             with st.expander("Show Raw Resume HTML"):
@@ -264,19 +394,50 @@ with tab1:
 with tab2:
     st.header("Semantic Search (ChromaDB + Engine Answer)")
     query_text = st.text_input("Query (e.g., 'Senior Python developer 10 years')")
+    search_mode = st.radio(
+        "Retrieval", ["Hybrid (BM25 + dense)", "Dense", "Keyword (BM25)"], horizontal=True,
+        help="Keyword search needs no embedding call; hybrid fuses both rankings (reciprocal rank fusion).",
+    )
+    # A per-session view: the shared cache keys entries by signature instead of being re-pointed by each
+    # session. Same key as the backend itself, since passage mode and aggregation change the hits too.
+    qcache = get_query_cache(persist_query_cache).for_signature(repr(backend_sig))
     if query_text:
-        # 1) embed query with the same embedder
-        q_vec = embedder.embed(query_text)
-        # 2) search Chroma (top 10)
-        hits = chroma_query(query_text, q_vec, top_k=10, where=None)
+        dense_hits, lexical_hits = [], []
+        if search_mode != "Keyword (BM25)":
+            # 1) embed query with the same embedder
+            q_vec = qcache.embedding(embedder.model_id, query_text, lambda: embedder.embed(query_text))
+            # 2) search the selected backend (top 10)
+            dense_hits = qcache.search(
+                ("dense", vector_digest(q_vec)), None, 10,
+                lambda: search_backend.search(q_vec, top_k=10, where=None),
+            )
+        if search_mode != "Dense":
+            lexical_hits = qcache.search(
+                ("bm25", query_text), None, 10,
+                lambda: bm25_index.search(query_text, top_k=10),
+            )
+        if search_mode == "Hybrid (BM25 + dense)":
+            hits = reciprocal_rank_fusion([dense_hits, lexical_hits], top_k=10)
+        else:
+            hits = dense_hits or lexical_hits
+        if use_summaries and hits:
+            hits = attach_summaries(
+                hits, get_summary_store(),
+                text_of=lambda cid: (dataset.get(cid) or {}).get("Resume_str"),
+            )
         # 3) ask engine to prepare an answer based on those hits
         if not hits:
             st.warning("No results.")
         else:
-            with st.spinner("Asking the engine to prepare an answer…"):
-                answer = answer_query(query_text, hits)
             st.subheader("Model‑prepared answer")
-            st.write(answer)
+            answer = qcache.lookup_answer(query_text, hits)
+            if answer is not None:
+                st.write(answer)
+            else:
+                # Render tokens as they arrive instead of blocking on the full completion
+                answer = st.write_stream(answer_query(query_text, hits, stream=True))
+                if isinstance(answer, str) and answer:
+                    qcache.store_answer(query_text, hits, answer)
             st.markdown("---")
             st.subheader("Top matches")
             for rank, h in enumerate(hits, 1):
@@ -284,5 +445,37 @@ with tab2:
                 meta = h.get("metadata") or {}
                 if meta.get("Category"):
                     st.caption(f"Category: {meta['Category']}")
-                doc = h.get("document") or ""
-                st.write(doc[:1200] + ("…" if len(doc) > 1200 else ""))
\ No newline at end of file
+                duplicates = dataset.duplicates(h["id"])
+                if duplicates:
+                    st.caption(f"Also submitted as IDs {', '.join(duplicates[:10])}"
+                               + (f" (+{len(duplicates) - 10} more)" if len(duplicates) > 10 else ""))
+                if h.get("summary"):
+                    st.write(h["summary"])
+                else:
+                    doc = h.get("document") or ""
+                    st.write(doc[:1200] + ("…" if len(doc) > 1200 else ""))
+
+with tab3:
+    st.header("Pipeline metrics")
+    # Collection is process-wide (METRICS_ENABLED at startup); it only changes
+    # when someone flips this toggle, not on every session's rerun.
+    st.session_state["collect_metrics"] = metrics.enabled()
+    st.toggle(
+        "Collect stage metrics", key="collect_metrics",
+        on_change=lambda: metrics.enable(st.session_state["collect_metrics"]),
+        help="Time load/parse/embed/index/query/answer stages and count engine calls and cache hits. Applies to every session.",
+    )
+    snap = metrics.snapshot()
+    if snap["stages"]:
+        stages = pd.DataFrame.from_dict(snap["stages"], orient="index")
+        stages.index.name = "stage"
+        st.dataframe(stages[["count", "total_s", "mean_s", "max_s", "items", "bytes", "errors"]])
+    if snap["counters"]:
+        st.subheader("Counters")
+        st.dataframe(pd.Series(snap["counters"], name="value").sort_index())
+    if snap["recent"]:
+        with st.expander("Recent spans"):
+            st.dataframe(pd.DataFrame(snap["recent"][::-1]))
+    if st.button("Reset metrics"):
+        metrics.reset()
+        st.rerun()